@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Persistent cache of answered queries, matched by cosine similarity of query embeddings.
+
+    Every entry records the collection fingerprint it was answered against; entries
+    from another fingerprint are dropped on lookup, so answers never outlive the data
+    they were generated from. Entries are also tagged with the retrieval options that
+    produced their sources, and only match lookups with the same tag.
+    """
+
+    def __init__(self, path, threshold=0.9, max_entries=1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, query TEXT NOT NULL, embedding BLOB NOT NULL, ai_response TEXT NOT NULL, "
+            "sources TEXT NOT NULL, fingerprint TEXT NOT NULL, last_access REAL NOT NULL, "
+            "retrieval TEXT NOT NULL DEFAULT '')"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(answers)")]
+        if "retrieval" not in columns:  # Cache files written before entries were tagged
+            self._conn.execute("ALTER TABLE answers ADD COLUMN retrieval TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+        self._load_matrix()
+
+    def _load_matrix(self):
+        """Keep the normalized query embeddings in memory as one matrix for lookups."""
+        rows = self._conn.execute("SELECT id, embedding, retrieval FROM answers").fetchall()
+        self._ids = [row[0] for row in rows]
+        self._retrieval = np.array([row[2] for row in rows], dtype=object)
+        if rows:
+            self._matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        else:
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def _drop_stale(self, fingerprint):
+        deleted = self._conn.execute("DELETE FROM answers WHERE fingerprint != ?", (fingerprint,)).rowcount
+        self._conn.commit()
+        if deleted:
+            self._load_matrix()
+
+    def lookup(self, query_vector, fingerprint, retrieval=""):
+        """
+        Return the cached answer closest to query_vector among the entries stored with the same
+        retrieval tag, if it clears the threshold, else None.
+        """
+        with self._lock:
+            self._drop_stale(fingerprint)
+            if not self._ids:
+                self.misses += 1
+                return None
+
+            similarities = np.where(self._retrieval == retrieval, self._matrix @ normalize(query_vector), -np.inf)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = self._ids[best]
+            query, ai_response, sources = self._conn.execute(
+                "SELECT query, ai_response, sources FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self._conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (time.time(), entry_id))
+            self._conn.commit()
+            self.hits += 1
+
+        return {
+            "cached_query": query,
+            "similarity": float(similarities[best]),
+            "ai_response": ai_response,
+            "sources": json.loads(sources),
+        }
+
+    def store(self, query, query_vector, ai_response, sources, fingerprint, retrieval=""):
+        """Add an answer, evicting the least recently used entries beyond max_entries."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (query, embedding, ai_response, sources, fingerprint, last_access, retrieval) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (query, normalize(query_vector).tobytes(), ai_response, json.dumps(sources), fingerprint, time.time(),
+                 retrieval)
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+            self._load_matrix()
+
+    def clear(self):
+        """Remove every cached answer."""
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._load_matrix()
+
+    def stats(self):
+        """Return hit/miss counters and the number of cached answers."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._ids),
+        }
+
+
+# Helper: unit-length float32 vector so a dot product is the cosine similarity
+def normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,190 @@
+import os
+import subprocess
+import tempfile
+import numpy as np
+from disk_cache import file_sha256
+
+# Whisper expects 16 kHz mono float32 audio
+SAMPLE_RATE = 16000
+
+PCM_CACHE_DIR = "./pcm_cache"
+PCM_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Energy-based voice activity detection
+VAD_FRAME_SECONDS = 0.03
+VAD_MARGIN_DB = 25.0         # frames this far below the loud speech level count as background
+VAD_FLOOR_DB = -50.0         # frames quieter than this (dBFS) are always silence
+VAD_MIN_SILENCE_SECONDS = 1.0  # shorter pauses are kept inside the surrounding speech
+VAD_PAD_SECONDS = 0.25
+VAD_BLOCK_SECONDS = 60  # frame energies are computed block by block to bound memory on long files
+
+
+def decode_audio(audio_file, output_path):
+    """
+    Decode any ffmpeg-readable audio once into a 16 kHz mono float32 .npy file.
+    ffmpeg streams raw samples to a temp file; the .npy header is written once the length is known.
+    """
+    directory = os.path.dirname(output_path) or "."
+    command = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", audio_file,
+        "-f", "f32le", "-ac", "1", "-acodec", "pcm_f32le", "-ar", str(SAMPLE_RATE), "-"
+    ]
+    with tempfile.TemporaryFile(dir=directory) as raw:
+        subprocess.run(command, stdout=raw, stderr=subprocess.DEVNULL, check=True)
+        num_samples = raw.tell() // 4
+        raw.seek(0)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.lib.format.write_array_header_1_0(f, {"descr": "<f4", "fortran_order": False, "shape": (num_samples,)})
+            for chunk in iter(lambda: raw.read(1024 * 1024), b""):
+                f.write(chunk)
+    os.replace(temp_path, output_path)
+
+
+class PCMCache:
+    """Decoded 16 kHz mono float32 audio keyed by source content hash, read back memory-mapped."""
+
+    def __init__(self, cache_dir=PCM_CACHE_DIR, max_bytes=PCM_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, audio_file):
+        return os.path.join(self.cache_dir, f"{file_sha256(audio_file)[:32]}.npy")
+
+    def load(self, audio_file):
+        """Return the decoded samples of audio_file as a read-only memmap, decoding on first use."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pcm_path = self.path(audio_file)
+        if os.path.exists(pcm_path):
+            os.utime(pcm_path)  # Mark as recently used for eviction
+        else:
+            decode_audio(audio_file, pcm_path)
+            self.evict()
+        return np.load(pcm_path, mmap_mode="r")
+
+    def evict(self):
+        """Remove the least recently used files beyond max_bytes."""
+        paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".npy")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        total = 0
+        for path in paths:
+            total += os.path.getsize(path)
+            if total > self.max_bytes:
+                os.remove(path)
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def frame_energies_db(samples, frame_seconds=VAD_FRAME_SECONDS):
+    """RMS level in dBFS of consecutive non-overlapping frames."""
+    frame = int(frame_seconds * SAMPLE_RATE)
+    frames_per_block = max(1, int(VAD_BLOCK_SECONDS / frame_seconds))
+    num_frames = len(samples) // frame
+    levels = np.empty(num_frames, dtype=np.float32)
+    for first in range(0, num_frames, frames_per_block):
+        last = min(num_frames, first + frames_per_block)
+        block = np.asarray(samples[first * frame:last * frame], dtype=np.float32).reshape(-1, frame)
+        levels[first:last] = 10 * np.log10(np.mean(block ** 2, axis=1) + 1e-10)
+    return levels
+
+
+def detect_speech(samples, margin_db=VAD_MARGIN_DB, floor_db=VAD_FLOOR_DB,
+                  min_silence_seconds=VAD_MIN_SILENCE_SECONDS, pad_seconds=VAD_PAD_SECONDS):
+    """
+    Return [(start_sample, end_sample)] regions that likely contain speech.
+
+    A frame is active when it is louder than both floor_db and the loud speech level
+    (95th percentile of frame energy) minus margin_db, so silences and music beds mixed
+    well under the voice are dropped. Pauses shorter than min_silence_seconds are kept.
+    """
+    levels = frame_energies_db(samples)
+    if len(levels) == 0:
+        return []
+
+    threshold = max(floor_db, float(np.percentile(levels, 95)) - margin_db)
+    active = levels > threshold
+    frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    pad = int(pad_seconds * SAMPLE_RATE)
+    min_gap = int(min_silence_seconds * SAMPLE_RATE)
+
+    # Edges of runs of active frames
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    regions = []
+    for start_frame, end_frame in zip(edges[::2], edges[1::2]):
+        start = max(0, int(start_frame) * frame - pad)
+        end = min(len(samples), int(end_frame) * frame + pad)
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+class SpeechAudio:
+    """
+    Speech regions of a recording cut into windows of at most window_seconds.
+
+    Each window holds the concatenated samples of its regions plus a timeline that maps
+    times within the window back to times in the original recording.
+    """
+
+    def __init__(self, samples, regions):
+        self.samples = samples
+        self.regions = regions
+        self.total_seconds = len(samples) / SAMPLE_RATE
+        self.speech_seconds = sum(end - start for start, end in regions) / SAMPLE_RATE
+        self.skipped_seconds = self.total_seconds - self.speech_seconds
+
+    def windows(self, window_seconds=None):
+        """Yield (window_samples, timeline); window_seconds=None puts all speech in one window."""
+        limit = int(window_seconds * SAMPLE_RATE) if window_seconds else None
+        pieces, window_starts, source_starts, length = [], [], [], 0
+        for start, end in self.regions:
+            while start < end:
+                take = end - start if limit is None else min(end - start, limit - length)
+                pieces.append(self.samples[start:start + take])
+                window_starts.append(length / SAMPLE_RATE)
+                source_starts.append(start / SAMPLE_RATE)
+                length += take
+                start += take
+                if limit is not None and length >= limit:
+                    yield self._window(pieces, window_starts, source_starts)
+                    pieces, window_starts, source_starts, length = [], [], [], 0
+        if pieces:
+            yield self._window(pieces, window_starts, source_starts)
+
+    def _window(self, pieces, window_starts, source_starts):
+        samples = np.concatenate([np.asarray(piece, dtype=np.float32) for piece in pieces])
+        return samples, (np.array(window_starts), np.array(source_starts))
+
+
+def to_source_time(timeline, seconds):
+    """Map a time within a speech window back to the original recording."""
+    window_starts, source_starts = timeline
+    index = max(0, int(np.searchsorted(window_starts, seconds, side="right")) - 1)
+    return float(source_starts[index] + seconds - window_starts[index])
+
+
+class AudioPreprocessor:
+    """Decode once through the PCM cache, then optionally drop non-speech with the energy VAD."""
+
+    def __init__(self, cache_dir=PCM_CACHE_DIR, use_vad=True):
+        self.pcm_cache = PCMCache(cache_dir)
+        self.use_vad = use_vad
+
+    def settings(self):
+        """VAD parameters, part of the transcription cache key since they change the audio Whisper sees."""
+        if not self.use_vad:
+            return None
+        return {"margin_db": VAD_MARGIN_DB, "floor_db": VAD_FLOOR_DB,
+                "min_silence": VAD_MIN_SILENCE_SECONDS, "pad": VAD_PAD_SECONDS}
+
+    def prepare(self, audio_file):
+        """Return the SpeechAudio of audio_file."""
+        samples = self.pcm_cache.load(audio_file)
+        regions = detect_speech(samples) if self.use_vad else [(0, len(samples))]
+        return SpeechAudio(samples, regions)
@@ -0,0 +1,48 @@
+import mmap
+import os
+import shutil
+import tempfile
+from disk_cache import file_sha256
+
+BLOB_STORE_DIR = "./blob_store"
+
+
+class BlobStore:
+    """
+    Content-addressed file store: each blob is saved once under its SHA-256
+    (blob_store/ab/cdef...), so identical images extracted from different pages or
+    reports share one file. Blobs are read back lazily through read-only mmaps.
+    """
+
+    def __init__(self, root=BLOB_STORE_DIR):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put_file(self, source_path):
+        """Store the contents of source_path and return its SHA-256 hex digest."""
+        digest = file_sha256(source_path)
+        blob_path = self.path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), prefix=".staging-")
+            os.close(fd)
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, blob_path)
+        return digest
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def open(self, digest):
+        """Read-only mmap over the blob bytes; use as a context manager to release it."""
+        with open(self.path(digest), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"Empty blob {digest}")
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, digest):
+        """Blob bytes, copied out of the mmap."""
+        with self.open(digest) as blob:
+            return blob[:]
@@ -1,11 +1,71 @@
 from yt_dlp import YoutubeDL
 import os
 import re
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Manifest of completed downloads, kept in the output folder
+MANIFEST_NAME = "download_manifest.json"
 
 class YouTubeAudioDownloader:
-    def __init__(self, output_folder):
+    def __init__(self, output_folder, ydl_factory=YoutubeDL, max_workers=4, per_host_limit=2):
+        """
+        ydl_factory builds the extractor from yt-dlp options (YoutubeDL by default; tests can pass
+        a local stand-in). max_workers and per_host_limit bound the concurrent download mode.
+        """
         self.output_folder = os.path.abspath(output_folder)
         self.audio_files_dict = {}
+        self.ydl_factory = ydl_factory
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.manifest_path = os.path.join(self.output_folder, MANIFEST_NAME)
+        self.manifest = self.load_manifest()
+        self._lock = threading.Lock()
+        self._host_semaphores = {}
+
+    def load_manifest(self):
+        """Load the URL -> {filename, size, sha256} manifest of completed downloads."""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_manifest(self):
+        """Write the manifest atomically so an interrupted run never leaves it half written."""
+        os.makedirs(self.output_folder, exist_ok=True)
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def lookup_manifest(self, video_url):
+        """Return the downloaded file for video_url if the manifest has it and it is still on disk."""
+        entry = self.manifest.get(video_url)
+        if not entry:
+            return None
+        full_path = os.path.join(self.output_folder, entry["filename"])
+        if os.path.exists(full_path) and os.path.getsize(full_path) == entry["size"]:
+            return full_path
+        return None
+
+    def record_download(self, video_url, full_path):
+        """Add a completed download to the manifest."""
+        digest = hashlib.sha256()
+        with open(full_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+        with self._lock:
+            self.manifest[video_url] = {
+                "filename": os.path.basename(full_path),
+                "size": os.path.getsize(full_path),
+                "sha256": digest.hexdigest()
+            }
+            self.audio_files_dict[video_url] = full_path
+            self.save_manifest()
 
     def get_safe_filename(self, filename):
         """Sanitize a filename to ensure it is safe for the filesystem."""
@@ -55,42 +115,68 @@ class YouTubeAudioDownloader:
 
     def download_audio(self, video_url):
         """Download audio from a YouTube video, skipping if already downloaded."""
+        cached_path = self.lookup_manifest(video_url)
+        if cached_path:
+            print(f"Skipping {os.path.basename(cached_path)}, already downloaded.")
+            with self._lock:
+                self.audio_files_dict[video_url] = cached_path
+            return cached_path
+
         try:
+            # The source audio stream is kept as is (no MP3 re-encode); the transcriber decodes it once
             ydl_opts = {
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
+                'format': 'bestaudio[ext=m4a]/bestaudio/best',
                 'outtmpl': os.path.join(self.output_folder, '%(title)s.%(ext)s'),
             }
 
-            with YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=False)  # Fetch metadata without downloading
-                filename = ydl.prepare_filename(info).replace(".webm", ".mp3").replace(".m4a", ".mp3")  # Adjust for mp3 format
+            with self.ydl_factory(ydl_opts) as ydl:
+                # Metadata is resolved once, by the same call that downloads (yt-dlp skips existing files)
+                info = ydl.extract_info(video_url, download=True)
+                full_path = os.path.join(self.output_folder, ydl.prepare_filename(info))
 
-                full_path = os.path.join(self.output_folder, filename)
-
-                if os.path.exists(full_path):
-                    print(f"Skipping {filename}, already downloaded.")
-                    self.audio_files_dict[video_url] = full_path
-                    return full_path
-
-                # Proceed with download
-                ydl.download([video_url])
-                print(f"Downloaded: {full_path}")
-                self.audio_files_dict[video_url] = full_path
-                return full_path
+            print(f"Downloaded: {full_path}")
+            self.record_download(video_url, full_path)
+            return full_path
         except Exception as e:
             print(f"Error downloading {video_url}: {str(e)}")
             return None
 
-    def download_multiple_audios(self, video_urls):
-        """Download multiple videos' audio."""
+    def download_multiple_audios(self, video_urls, concurrent=False):
+        """Download multiple videos' audio, optionally with a bounded worker pool."""
+        if concurrent:
+            return self.download_concurrently(video_urls)
+
         for url in video_urls:
             print(f"Processing: {url}")
             audio_file = self.download_audio(url)
             if audio_file is None:
                 print(f"Failed to download {url}")
         return self.audio_files_dict
+
+    def _download_with_host_limit(self, video_url):
+        host = urlparse(video_url).netloc
+        with self._lock:
+            semaphore = self._host_semaphores.setdefault(host, threading.Semaphore(self.per_host_limit))
+        with semaphore:
+            return self.download_audio(video_url)
+
+    def download_concurrently(self, video_urls):
+        """
+        Download with at most max_workers downloads in flight and per_host_limit per host.
+        URLs already in the manifest are resolved without any yt-dlp call.
+        """
+        pending = []
+        for url in video_urls:
+            if self.lookup_manifest(url):
+                self.download_audio(url)
+            elif url not in pending:
+                pending.append(url)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for url, audio_file in zip(pending, executor.map(self._download_with_host_limit, pending)):
+                if audio_file is None:
+                    print(f"Failed to download {url}")
+
+        # Keep the input order regardless of completion order
+        self.audio_files_dict = {url: self.audio_files_dict[url] for url in video_urls if url in self.audio_files_dict}
+        return self.audio_files_dict
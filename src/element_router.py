@@ -0,0 +1,127 @@
+import json
+from unstructured.documents.elements import NarrativeText, Image, Table
+
+
+def element_kind(element):
+    """Route key of an unstructured element: "text", "image", "table" or None."""
+    if isinstance(element, NarrativeText):
+        return "text"
+    if isinstance(element, Image):
+        return "image"
+    if isinstance(element, Table):
+        return "table"
+    return None
+
+
+def split_elements(elements):
+    """Group elements by kind in a single pass, keeping document order within each kind."""
+    grouped = {"text": [], "image": [], "table": []}
+    for element in elements:
+        kind = element_kind(element)
+        if kind:
+            grouped[kind].append(element)
+    return grouped
+
+
+class ListSink:
+    """Collects routed records in memory."""
+
+    def __init__(self):
+        self.records = []
+
+    def add(self, record):
+        self.records.append(record)
+
+    def page_complete(self, page_number):
+        pass
+
+    def close(self):
+        pass
+
+
+class JSONLSink:
+    """Buffers the records of the current page and appends them to a JSONL file once the page is complete."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._pending = []
+        self._file = open(path, "w", encoding="utf-8")
+
+    def add(self, record):
+        self._pending.append(record)
+
+    def page_complete(self, page_number):
+        for record in self._pending:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self.count += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.page_complete(None)
+        self._file.close()
+
+
+class ElementRouter:
+    """
+    Single dispatcher pass over partitioned elements.
+
+    Each element is turned into a text, image or table record and handed to the sink
+    registered for its kind. Sinks are told when a page is complete, so streaming sinks
+    only ever hold one page of records.
+    """
+
+    def __init__(self, source_document, sinks):
+        self.source_document = source_document
+        self.sinks = sinks
+        self.current_page = None
+        self.paragraph_counters = {}
+
+    def route(self, element):
+        page_number = element.metadata.page_number
+        if page_number != self.current_page:
+            if self.current_page is not None:
+                self._page_complete(self.current_page)
+            self.current_page = page_number
+
+        kind = element_kind(element)
+        if kind is None or kind not in self.sinks:
+            return
+
+        if kind == "text":
+            self.paragraph_counters[page_number] = self.paragraph_counters.get(page_number, 0) + 1
+            record = {
+                "source_document": self.source_document,
+                "page_number": page_number,
+                "paragraph_number": self.paragraph_counters[page_number],
+                "text": element.text
+            }
+        elif kind == "image":
+            record = {
+                "source_document": self.source_document,
+                "page_number": page_number,
+                "image_path": getattr(element.metadata, "image_path", None)
+            }
+        else:
+            record = {
+                "source_document": self.source_document,
+                "page_number": page_number,
+                "table_content": str(element)
+            }
+        self.sinks[kind].add(record)
+
+    def route_all(self, elements):
+        for element in elements:
+            self.route(element)
+
+    def _page_complete(self, page_number):
+        for sink in self.sinks.values():
+            sink.page_complete(page_number)
+
+    def close(self):
+        """Flush the last page and close every sink."""
+        if self.current_page is not None:
+            self._page_complete(self.current_page)
+        for sink in self.sinks.values():
+            sink.close()
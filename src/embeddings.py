@@ -0,0 +1,75 @@
+import hashlib
+import numpy as np
+import resources
+from disk_cache import DiskLRUCache
+from record_store import EmbeddingWriter, embeddings_path, iter_batches, iter_jsonl
+from onnx_backend import use_onnx, backend_model_id, OnnxSentenceEncoder
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ENCODE_BATCH_SIZE = 64
+
+# Embedding cache shared by the ChromaDB and Weaviate storage modules
+EMBEDDING_CACHE_PATH = "./embedding_cache/embeddings.sqlite3"
+EMBEDDING_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Embedding model and cache are created on first use; INFERENCE_BACKEND=onnx selects the int8 ONNX model
+def _load_embedding_model():
+    if use_onnx():
+        return OnnxSentenceEncoder(EMBEDDING_MODEL_NAME)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+resources.register("embedding_model", _load_embedding_model)
+resources.register("embedding_cache", lambda: DiskLRUCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_BYTES))
+
+def get_embedding_model():
+    return resources.get("embedding_model")
+
+def get_embedding_cache():
+    return resources.get("embedding_cache")
+
+# Helper: collapse whitespace so formatting-only differences share a cache entry
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+def embedding_model_id() -> str:
+    """Embedding model name plus the inference backend when it is not the fp32 default."""
+    return backend_model_id(EMBEDDING_MODEL_NAME)
+
+def embedding_key(text: str, model_name: str = None) -> str:
+    """Cache key for (model name and backend, normalized-text hash)."""
+    model_name = model_name or embedding_model_id()
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{text_hash}"
+
+def get_embeddings(texts, batch_size=ENCODE_BATCH_SIZE):
+    """Embed a list of texts, encoding only those missing from the on-disk cache."""
+    normalized = [normalize_text(text) for text in texts]
+    keys = [embedding_key(text) for text in normalized]
+    embedding_cache = get_embedding_cache()
+    cached = embedding_cache.get_many(keys)
+
+    missing = {key: text for key, text in zip(keys, normalized) if key not in cached}
+    if missing:
+        vectors = get_embedding_model().encode(list(missing.values()), batch_size=batch_size)
+        new_entries = {
+            key: np.asarray(vector, dtype=np.float32).tobytes()
+            for key, vector in zip(missing, vectors)
+        }
+        embedding_cache.set_many(new_entries)
+        cached.update(new_entries)
+
+    return [np.frombuffer(cached[key], dtype=np.float32).tolist() for key in keys]
+
+# Generate embedding
+def get_embedding(text):
+    return get_embeddings([text])[0]
+
+def embed_jsonl(jsonl_path, field, batch_size=ENCODE_BATCH_SIZE):
+    """Write the row-aligned sidecar embedding matrix of field for a JSONL file, one batch in memory at a time."""
+    writer = EmbeddingWriter(embeddings_path(jsonl_path, embedding_model_id()))
+    for batch in iter_batches(iter_jsonl(jsonl_path), batch_size):
+        writer.append(get_embeddings([record[field] for record in batch], batch_size))
+    writer.close()
+    print(f"Embedded {writer.rows} records of {jsonl_path} into {writer.path}")
+    return writer.path
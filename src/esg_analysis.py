@@ -1,30 +1,98 @@
+import json
 import textwrap
-from vector_storage import search_multimodal
+import time
+from vector_store import get_vector_store
 # from esg_summary import generate_response
 from esg_summary import generate_llm_response
+from answer_cache import SemanticAnswerCache
+from text_chunker import format_paragraphs
+from reranker import get_reranker, RERANK_CANDIDATES, RERANK_TOP_K
+import resources
 
-def esg_analysis(user_query: str):
-    """Retrieve ESG documents from ChromaDB and assemble context for AI response."""
-    search_results = search_multimodal(user_query)
+# Semantic answer cache: near-identical questions reuse a previous answer
+ANSWER_CACHE_PATH = "./answer_cache/answers.sqlite3"
+ANSWER_CACHE_THRESHOLD = 0.9
+ANSWER_CACHE_MAX_ENTRIES = 1000
+resources.register(
+    "answer_cache",
+    lambda: SemanticAnswerCache(ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES)
+)
+
+def get_answer_cache():
+    return resources.get("answer_cache")
+
+# Hits retrieved per query without reranking
+SEARCH_LIMIT = 10
+
+def retrieval_tag(modality_quotas, hybrid, rerank, limit):
+    """Retrieval options that shape the sources of an answer; cached answers only match the same ones."""
+    return json.dumps({"quotas": modality_quotas, "hybrid": hybrid, "rerank": rerank, "limit": limit},
+                      sort_keys=True)
+
+def get_cache_stats():
+    """Hit/miss counters of the search caches and the answer cache."""
+    return {**get_vector_store().cache_stats(), "answers": get_answer_cache().stats()}
+
+def esg_analysis(user_query: str, use_answer_cache: bool = True, modality_quotas: dict = None,
+                 hybrid: bool = False, rerank: bool = False):
+    """
+    Retrieve ESG documents from the configured vector store and assemble context for AI response.
+    With modality_quotas ({content_type: hits}), each modality is queried concurrently for its quota;
+    hybrid=True fuses BM25 and vector rankings, for exact fund names and figures. rerank=True
+    over-fetches RERANK_CANDIDATES hits and keeps the RERANK_TOP_K best by cross-encoder score
+    (quota mode keeps all its hits, reordered).
+    """
+    store = get_vector_store()
+    limit = RERANK_CANDIDATES if rerank else SEARCH_LIMIT
+    retrieval = retrieval_tag(modality_quotas, hybrid, rerank, limit)
+    if use_answer_cache:
+        query_vector = store.query_embedding(user_query)
+        fingerprint = store.fingerprint()
+        cached = get_answer_cache().lookup(query_vector, fingerprint, retrieval)
+        if cached:
+            return {
+                "user_query": user_query,
+                "ai_response": cached["ai_response"],
+                "sources": cached["sources"],
+                "retrieval_seconds": 0.0,
+                "cache_stats": get_cache_stats(),
+                "cached_query": cached["cached_query"]
+            }
+
+    retrieval_start = time.perf_counter()
+    modality_timings = None
+    if modality_quotas:
+        retrieved = store.search_by_modality(user_query, modality_quotas, hybrid=hybrid)
+        hits, modality_timings = retrieved["hits"], retrieved["timings"]
+    else:
+        hits = store.search(user_query, limit, hybrid=hybrid)
+    retrieval_seconds = time.perf_counter() - retrieval_start
+
+    rerank_stats = None
+    if rerank:
+        rerank_stats = get_reranker().rerank(user_query, hits, None if modality_quotas else RERANK_TOP_K)
+        hits = rerank_stats.pop("hits")
 
     context = ""  # Start assembling the context
     sources = []
 
-    # Ensure we process results correctly
-    if search_results and "metadatas" in search_results and search_results["metadatas"]:
-        for item in search_results["metadatas"][0]:  # ChromaDB stores metadata in lists
-            ctype = item.get("content_type", "unknown")
+    for hit in hits:
+        item = hit["metadata"]
+        ctype = item.get("content_type", "unknown")
 
-            if ctype == "audio":
-                context += f"Audio Transcription from {item['url']}: {item['transcription']}\n\n"
-            elif ctype == "text":
-                context += f"Text from {item['source_document']} (Page {item['page_number']}, Paragraph {item['paragraph_number']}): {item['text']}\n\n"
-            elif ctype == "image":
-                context += f"Image from {item['source_document']} (Page {item['page_number']}, Path: {item['image_path']})\n\n"
-            elif ctype == "table":
-                context += f"Table from {item['source_document']} (Page {item['page_number']}): {item['table_content']}\n\n"
+        if ctype == "audio":
+            context += f"Audio Transcription from {item['url']}: {item['transcription']}\n\n"
+        elif ctype == "audio_segment":
+            context += f"Audio Transcription from {item['url']} ({format_timestamp(item['start'])}-{format_timestamp(item['end'])}): {item['transcription']}\n\n"
+        elif ctype == "text":
+            context += f"Text from {item['source_document']} (Page {item['page_number']}, {format_paragraphs(item)}): {item['text']}\n\n"
+        elif ctype == "image":
+            context += f"Image from {item['source_document']} (Page {item['page_number']}, Path: {item['image_path']})\n\n"
+        elif ctype == "table":
+            context += f"Table from {item['source_document']} (Page {item['page_number']}): {item['table_content']}\n\n"
 
-            sources.append(item)  # Store metadata for reference
+        # Store metadata for reference
+        sources.append({**item, "distance": hit["distance"]} if hit["distance"] is not None else item)
 
     # Fallback: If no results, provide a default message
     if not context.strip():
@@ -32,32 +100,66 @@ def esg_analysis(user_query: str):
 
     response = generate_llm_response(user_query)
 
-    return {
+    if use_answer_cache:
+        get_answer_cache().store(user_query, query_vector, response, sources, fingerprint, retrieval)
+
+    result = {
         "user_query": user_query,
         "ai_response": response,
-        "sources": sources
+        "sources": sources,
+        "retrieval_seconds": retrieval_seconds,
+        "cache_stats": get_cache_stats()
     }
+    if modality_timings is not None:
+        result["modality_timings"] = modality_timings
+    if rerank_stats is not None:
+        result["rerank"] = rerank_stats
+    return result
+
 
+def format_timestamp(seconds):
+    """Format seconds as H:MM:SS for audio citations."""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
 
 def wrap_text(text, width=120):
     """Wraps text for better readability."""
     return textwrap.fill(text, width=width)
 
-def analyze_and_print_esg_results(user_question):
+def analyze_and_print_esg_results(user_question, modality_quotas=None, hybrid=False, rerank=False):
     """Runs ESG analysis and prints structured results."""
-    result = esg_analysis(user_question)
+    result = esg_analysis(user_question, modality_quotas=modality_quotas, hybrid=hybrid, rerank=rerank)
 
     print("User Query:", result["user_query"])
+    if "cached_query" in result:
+        print(f"(answered from cache, matched: {result['cached_query']})")
     print("\nAI Response:", wrap_text(result["ai_response"]))
+    search_stats = result["cache_stats"]["search_results"]
+    print(f"\nRetrieval: {result['retrieval_seconds'] * 1000:.1f} ms "
+          f"(search cache {search_stats['hits']} hits / {search_stats['misses']} misses)")
+    if "modality_timings" in result:
+        print("Per modality: " + ", ".join(f"{content_type} {seconds * 1000:.1f} ms"
+                                           for content_type, seconds in result["modality_timings"].items()))
+    if "rerank" in result:
+        rerank_stats = result["rerank"]
+        print(f"Rerank: {rerank_stats['seconds'] * 1000:.1f} ms over {rerank_stats['candidates']} candidates "
+              f"({rerank_stats['scored']} scored, {rerank_stats['cached']} cached, "
+              f"{len(rerank_stats['position_changes'])} moved)")
+        for change in rerank_stats["position_changes"]:
+            print(f"  {change['id']}: {change['from'] + 1} -> {change['to'] + 1}")
     print("\nSources (sorted by relevance):")
     for source in result["sources"]:
-        print(f"- Type: {source['type']}, Distance: {source['distance']:.3f}")
-        if source['type'] == 'text':
-            print(f" Document: {source['document']}, Page: {source['page']}, Paragraph: {source['paragraph']}")
-        elif source['type'] == 'image':
-            print(f" Document: {source['document']}, Page: {source['page']}, Image Path: {source['image_path']}")
-        elif source['type'] == 'table':
-            print(f" Document: {source['document']}, Page: {source['page']}")
-        elif source['type'] == 'audio':
+        ctype = source.get("content_type", "unknown")
+        distance = f", Distance: {source['distance']:.3f}" if "distance" in source else ""
+        print(f"- Type: {ctype}{distance}")
+        if ctype == 'text':
+            print(f" Document: {source['source_document']}, Page: {source['page_number']}, {format_paragraphs(source)}")
+        elif ctype == 'image':
+            print(f" Document: {source['source_document']}, Page: {source['page_number']}, Image Path: {source['image_path']}")
+        elif ctype == 'table':
+            print(f" Document: {source['source_document']}, Page: {source['page_number']}")
+        elif ctype == 'audio':
             print(f" URL: {source['url']}")
+        elif ctype == 'audio_segment':
+            print(f" URL: {source['url']}, At: {format_timestamp(source['start'])}")
         print("---")
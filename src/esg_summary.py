@@ -1,9 +1,9 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from transformers import pipeline
 import os
-import base64
-from unstructured.documents.elements import Table
+import hashlib
+import resources
+from blob_store import BlobStore
+from disk_cache import DiskLRUCache
+from onnx_backend import use_onnx, backend_model_id, load_onnx_text_generator
 
 # Table summarization prompt
 TABLES_SUMMARIZER_PROMPT = """
@@ -27,8 +27,35 @@ Image: {image_element}
 Limit your description to 3-4 sentences.
 """
 
-# Initialize text generation pipeline
-text_generator = pipeline("text2text-generation", model="google/flan-t5-base")
+SUMMARY_MODEL_NAME = "google/flan-t5-base"
+
+# Prompts per Flan-T5 forward pass in batched summarization
+SUMMARY_BATCH_SIZE = 8
+
+# Generated descriptions keyed by (model, prompt template, table text or image bytes)
+SUMMARY_CACHE_PATH = "./summary_cache/summaries.sqlite3"
+SUMMARY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Text generation pipeline, loaded on first use; INFERENCE_BACKEND=onnx selects the int8 ONNX model
+def _load_text_generator():
+    if use_onnx():
+        return load_onnx_text_generator(SUMMARY_MODEL_NAME)
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=SUMMARY_MODEL_NAME)
+
+resources.register("text_generator", _load_text_generator)
+resources.register("summary_cache", lambda: DiskLRUCache(SUMMARY_CACHE_PATH, SUMMARY_CACHE_MAX_BYTES))
+
+def get_text_generator():
+    return resources.get("text_generator")
+
+def get_summary_cache():
+    return resources.get("summary_cache")
+
+def summary_key(prompt_template: str, content_sha256: str) -> str:
+    """Cache key for (model id, prompt template hash, element content hash)."""
+    template_hash = hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()
+    return f"{backend_model_id(SUMMARY_MODEL_NAME)}:{template_hash[:16]}:{content_sha256}"
 
 # def generate_llm_response(prompt: str) -> str:
 #     """Generates a response from an LLM based on the provided prompt."""
@@ -40,62 +67,127 @@ def generate_llm_response(prompt: str) -> str:
     # Ensure prompt is within model's max token limit
     prompt = prompt[:512]  # Truncate to 512 tokens because i noticed that the Flan-T5 model has a maximum token limit of 512
     
-    response = text_generator(prompt, max_new_tokens=512, do_sample=False)[0]['generated_text']
+    response = get_text_generator()(prompt, max_new_tokens=512, do_sample=False)[0]['generated_text']
     return response
 
+def generate_llm_responses(prompts, batch_size=SUMMARY_BATCH_SIZE):
+    """
+    Generate responses for many prompts in batches, returned in the order of prompts.
+    Prompts are sorted by token length so each batch pads to similar lengths.
+    """
+    if not prompts:
+        return []
+    prompts = [prompt[:512] for prompt in prompts]  # Same truncation as generate_llm_response
+    text_generator = get_text_generator()
+
+    lengths = [len(ids) for ids in text_generator.tokenizer(prompts)["input_ids"]]
+    order = sorted(range(len(prompts)), key=lambda i: lengths[i], reverse=True)
+    outputs = text_generator(
+        [prompts[i] for i in order], batch_size=batch_size, max_new_tokens=512, do_sample=False
+    )
+
+    # A list input gives one dict per prompt; some pipeline versions wrap each in a list
+    responses = [None] * len(prompts)
+    for i, output in zip(order, outputs):
+        responses[i] = (output[0] if isinstance(output, list) else output)['generated_text']
+    return responses
+
+def generate_cached_responses(prompts, keys, batch_size=SUMMARY_BATCH_SIZE):
+    """
+    Like generate_llm_responses, but prompts whose key is in the summary cache are not sent to
+    the model, and prompts sharing a key are generated once.
+    """
+    summary_cache = get_summary_cache()
+    cached = summary_cache.get_many(keys)
+
+    hits = sum(key in cached for key in keys)
+    missing = {}
+    for key, prompt in zip(keys, prompts):
+        if key not in cached:
+            missing.setdefault(key, prompt)
+    if missing:
+        responses = generate_llm_responses(list(missing.values()), batch_size)
+        new_entries = {key: response.encode("utf-8") for key, response in zip(missing, responses)}
+        summary_cache.set_many(new_entries)
+        cached.update(new_entries)
+
+    stats = summary_cache.stats()
+    print(f"Summary cache: {hits} of {len(keys)} from cache, {len(missing)} generated "
+          f"({stats['entries']} entries, {stats['bytes'] / 1024:.0f} KB)")
+    return [cached[key].decode("utf-8") for key in keys]
+
+
+def extract_table_metadata_with_summary(esg_report, source_document, batch_size=SUMMARY_BATCH_SIZE):
+    """Extracts tables and summarizes them using an LLM, batch_size prompts per forward pass; known tables come from the summary cache."""
+    from langchain_core.prompts import ChatPromptTemplate
+    from element_router import element_kind
 
-def extract_table_metadata_with_summary(esg_report, source_document):
-    """Extracts tables and summarizes them using an LLM."""
     table_data = []
+    prompts = []
+    keys = []
     prompt_template = ChatPromptTemplate.from_template(TABLES_SUMMARIZER_PROMPT)
 
     for element in esg_report:
-        if isinstance(element, Table):
+        if element_kind(element) == "table":
             page_number = element.metadata.page_number
             table_content = str(element)
 
             # Format prompt using LangChain template
             messages = prompt_template.format_messages(table_content=table_content)
-            full_prompt = messages[0].content if messages else ""
-
-            # Generate summary using LLM
-            description = generate_llm_response(full_prompt)
+            prompts.append(messages[0].content if messages else "")
+            keys.append(summary_key(TABLES_SUMMARIZER_PROMPT, hashlib.sha256(table_content.encode("utf-8")).hexdigest()))
 
             table_data.append({
                 "source_document": source_document,
                 "page_number": page_number,
                 "table_content": table_content,
-                "description": description.strip()
+                "description": None  # Filled in by the batched pass below
             })
+
+    # Generate the summaries missing from the cache in batches
+    for table, description in zip(table_data, generate_cached_responses(prompts, keys, batch_size)):
+        table["description"] = description.strip()
     return table_data
 
-def extract_image_metadata_with_summary(esg_report, source_document):
-    """Extracts image metadata and summarizes them using an LLM."""
+def extract_image_metadata_with_summary(esg_report, source_document, batch_size=SUMMARY_BATCH_SIZE, blob_store=None):
+    """
+    Extracts image metadata and summarizes them using an LLM, batch_size prompts per forward pass;
+    known images come from the summary cache. Image bytes go to the content-addressed blob store
+    and records only carry their image_sha256.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    from element_router import element_kind
+
     image_data = []
+    prompts = []
+    keys = []
+    blob_store = blob_store or BlobStore()
     prompt_template = ChatPromptTemplate.from_template(IMAGES_SUMMARIZER_PROMPT)
 
     for element in esg_report:
-        if "Image" in str(type(element)):
+        if element_kind(element) == "image":
             page_number = getattr(element.metadata, 'page_number', None)
             image_path = getattr(element.metadata, 'image_path', None)
 
             if image_path and os.path.exists(image_path):
                 # Format prompt
                 messages = prompt_template.format_messages(image_element=image_path)
-                full_prompt = messages[0].content if messages else ""
-                description = generate_llm_response(full_prompt)
+                prompts.append(messages[0].content if messages else "")
 
-                with open(image_path, "rb") as img_file:
-                    encoded_string = base64.b64encode(img_file.read()).decode("utf-8")
+                image_sha256 = blob_store.put_file(image_path)
+                keys.append(summary_key(IMAGES_SUMMARIZER_PROMPT, image_sha256))
 
                 image_data.append({
                     "source_document": source_document,
                     "page_number": page_number,
                     "image_path": image_path,
-                    "description": description.strip(),
-                    "base64_encoding": encoded_string
+                    "description": None,  # Filled in by the batched pass below
+                    "image_sha256": image_sha256
                 })
             else:
                 print(f"Warning: Image file not found for page {page_number}")
 
+    # Generate the descriptions missing from the cache in batches
+    for image, description in zip(image_data, generate_cached_responses(prompts, keys, batch_size)):
+        image["description"] = description.strip()
     return image_data
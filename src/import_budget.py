@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+# Modules are expected to import without loading models or opening clients.
+# Each one is imported in a fresh interpreter so timings do not share warm imports.
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.0"))
+MODULES = [
+    "resources",
+    "embeddings",
+    "lexical_index",
+    "vector_storage",
+    "weaviate_vector_storage",
+    "vector_store",
+    "numpy_vector_store",
+    "reranker",
+    "esg_summary",
+    "esg_analysis",
+    "transcriber",
+    "pdf_processor",
+]
+
+MEASURE_SNIPPET = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_import_time(module):
+    """Import time of a single module, in seconds, measured in a fresh interpreter."""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_SNIPPET.format(module=module)],
+        cwd=src_dir, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def check_import_budget(modules=MODULES, budget=IMPORT_BUDGET_SECONDS):
+    """Print the import time of every module and return the ones over budget."""
+    over_budget = []
+    for module in modules:
+        seconds = measure_import_time(module)
+        status = "OK" if seconds <= budget else "OVER BUDGET"
+        print(f"{module:<28} {seconds * 1000:8.1f} ms  {status}")
+        if seconds > budget:
+            over_budget.append(module)
+    return over_budget
+
+
+if __name__ == "__main__":
+    failed = check_import_budget()
+    if failed:
+        print(f"Import budget of {IMPORT_BUDGET_SECONDS:.2f}s exceeded by: {', '.join(failed)}")
+        sys.exit(1)
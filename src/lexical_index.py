@@ -0,0 +1,211 @@
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+import numpy as np
+
+# BM25 parameters and the reciprocal rank fusion constant used by the hybrid search modes
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+# Record fields indexed lexically: paragraphs, transcriptions, table contents and summaries
+LEXICAL_FIELDS = ("text", "transcription", "table_content", "description")
+
+# Words, with the separators inside numbers and codes kept ("1,234.5", "q1", "esg-related")
+TOKEN_PATTERN = re.compile(r"\w+(?:[.,\-/]\w+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def lexical_document(record):
+    """Text of a record that goes into the lexical index."""
+    return "\n".join(record[field] for field in LEXICAL_FIELDS if record.get(field))
+
+
+# Helper: 64-bit content hash, so unchanged documents are not re-tokenized
+def _text_hash(text):
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little", signed=True)
+
+
+def _pack_strings(strings):
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(array):
+    data = array.tobytes().decode("utf-8")
+    return data.split("\n") if data else []
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over record IDs, saved as one compressed .npz file.
+
+    Postings are stored term-major (CSR): term_offsets[t]:term_offsets[t + 1] slices the
+    document numbers and term frequencies of term t. update() and remove() are buffered and
+    applied in one pass by commit(), which only tokenizes new or changed documents.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.ids = []
+        self.hashes = np.zeros(0, dtype=np.int64)
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.terms = []
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.zeros(0, dtype=np.int32)
+        self.postings_tf = np.zeros(0, dtype=np.uint16)
+        self._pending = {}  # id -> (hash, Counter of terms), or None to delete
+        if path and os.path.exists(path):
+            self.load(path)
+        self._prepare()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self, path):
+        with np.load(path) as data:
+            self.ids = _unpack_strings(data["ids"])
+            self.hashes = data["hashes"]
+            self.doc_lengths = data["doc_lengths"]
+            self.terms = _unpack_strings(data["terms"])
+            self.term_offsets = data["term_offsets"]
+            self.postings_docs = data["postings_docs"]
+            self.postings_tf = data["postings_tf"]
+
+    def _prepare(self):
+        """Lookup tables derived from the arrays, rebuilt after every commit."""
+        self.row_of = {record_id: row for row, record_id in enumerate(self.ids)}
+        self.term_ids = {term: term_id for term_id, term in enumerate(self.terms)}
+        average_length = self.doc_lengths.mean() if len(self.doc_lengths) else 1.0
+        self.length_norm = (BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(average_length, 1e-9))
+                            ).astype(np.float32)
+
+    def update(self, ids, texts):
+        """Queue documents for (re)indexing; returns how many were new or changed."""
+        changed = 0
+        for record_id, text in zip(ids, texts):
+            text_hash = _text_hash(text)
+            pending = self._pending.get(record_id)
+            if pending is not None and pending[0] == text_hash:
+                continue
+            row = self.row_of.get(record_id)
+            if pending is None and row is not None and self.hashes[row] == text_hash:
+                self._pending.pop(record_id, None)  # Re-added after a queued delete
+                continue
+            self._pending[record_id] = (text_hash, Counter(tokenize(text)))
+            changed += 1
+        return changed
+
+    def remove(self, ids):
+        """Queue documents for deletion."""
+        for record_id in ids:
+            if record_id in self.row_of or record_id in self._pending:
+                self._pending[record_id] = None
+
+    def commit(self):
+        """Apply the queued updates and deletions; returns False when there were none."""
+        if not self._pending:
+            return False
+
+        # Keep the postings of untouched documents, renumbered
+        keep = np.array([record_id not in self._pending for record_id in self.ids], dtype=bool)
+        new_row = np.cumsum(keep) - 1
+        posting_terms = np.repeat(np.arange(len(self.terms)), np.diff(self.term_offsets))
+        kept = keep[self.postings_docs] if len(self.postings_docs) else np.zeros(0, dtype=bool)
+        term_parts = [posting_terms[kept]]
+        doc_parts = [new_row[self.postings_docs[kept]]]
+        tf_parts = [self.postings_tf[kept]]
+
+        ids = [record_id for record_id, kept_doc in zip(self.ids, keep) if kept_doc]
+        hashes = [self.hashes[keep]]
+        lengths = [self.doc_lengths[keep]]
+        terms = list(self.terms)
+        term_ids = dict(self.term_ids)
+
+        added = [(record_id, entry) for record_id, entry in self._pending.items() if entry is not None]
+        for record_id, (text_hash, counts) in added:
+            doc = len(ids)
+            ids.append(record_id)
+            for term in counts:
+                if term not in term_ids:
+                    term_ids[term] = len(terms)
+                    terms.append(term)
+            term_parts.append(np.array([term_ids[term] for term in counts], dtype=np.int64))
+            doc_parts.append(np.full(len(counts), doc, dtype=np.int64))
+            tf_parts.append(np.minimum(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)), 65535))
+        hashes.append(np.array([entry[0] for _, entry in added], dtype=np.int64))
+        lengths.append(np.array([sum(entry[1].values()) for _, entry in added], dtype=np.int32))
+
+        posting_terms = np.concatenate(term_parts).astype(np.int64)
+        postings_docs = np.concatenate(doc_parts).astype(np.int32)
+        postings_tf = np.concatenate(tf_parts).astype(np.uint16)
+
+        # Drop terms without postings, then sort the postings term-major
+        used, posting_terms = np.unique(posting_terms, return_inverse=True)
+        order = np.lexsort((postings_docs, posting_terms))
+        self.terms = [terms[term_id] for term_id in used]
+        self.term_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(posting_terms, minlength=len(used))))
+        ).astype(np.int64)
+        self.postings_docs = postings_docs[order]
+        self.postings_tf = postings_tf[order]
+        self.ids = ids
+        self.hashes = np.concatenate(hashes)
+        self.doc_lengths = np.concatenate(lengths)
+        self._pending = {}
+        self._prepare()
+        return True
+
+    def save(self, path=None):
+        """Commit and write the index atomically."""
+        self.commit()
+        path = path or self.path
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(
+                f, ids=_pack_strings(self.ids), hashes=self.hashes, doc_lengths=self.doc_lengths,
+                terms=_pack_strings(self.terms), term_offsets=self.term_offsets,
+                postings_docs=self.postings_docs, postings_tf=self.postings_tf,
+            )
+        os.replace(temp_path, path)
+
+    def search(self, query, limit=10, allowed=None):
+        """
+        Top (id, BM25 score) pairs for the query, best first; documents without a query term are left
+        out, as are those masked out by allowed (a boolean array over the documents, when given).
+        """
+        if not self.ids:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            idf = np.log1p((len(self.ids) - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self.length_norm[docs])
+        if allowed is not None:
+            scores[~allowed] = 0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(self.ids[row], float(scores[row])) for row in matched]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked ID lists into [(id, score)], best first: score = sum of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, record_id in enumerate(ranking, start=1):
+            scores[record_id] = scores.get(record_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
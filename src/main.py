@@ -1,9 +1,9 @@
 from downloader import YouTubeAudioDownloader
 from transcriber import AudioTranscriber
+from text_chunker import chunk_text_records
 from pdf_processor import PDFProcessor
-import whisper
-import torch
-import json
+from element_router import split_elements
+from record_store import write_jsonl, iter_jsonl
 import os
 from esg_summary import extract_table_metadata_with_summary, extract_image_metadata_with_summary
 
@@ -13,6 +13,7 @@ DATA_FOLDER = "data"
 TRANSCRIPTIONS_FOLDER = "transcriptions"
 ESG_REPORT_PATH = "data/Global_ESG_Flows_Q1_2024_Report.pdf"
 IMAGE_FOLDER = "data/images"
+TRANSCRIBE_WORKERS = 2
 os.makedirs(TRANSCRIPTIONS_FOLDER, exist_ok=True)
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
 
@@ -26,44 +27,47 @@ video_urls = [
 ]
 
 # Download audios, skipping existing files
-audio_files = downloader.download_multiple_audios(video_urls)
+audio_files = downloader.download_multiple_audios(video_urls, concurrent=True)
 
-# Initialize transcriber
-transcriber = AudioTranscriber(input_folder=DATA_FOLDER)
+# Initialize transcriber (Whisper "tiny" on GPU when available)
+transcriber = AudioTranscriber(input_folder=DATA_FOLDER, model_name="tiny")
 
-# audio_data is directly returned from transcribe_all_audios()
-audio_data = transcriber.transcribe_all_audios(audio_files)
+# Transcribe audio files once into full transcripts and timestamped segments;
+# on CPU each worker process loads the model once
+if transcriber.device == "cpu":
+    transcriptions_dict, segment_data = transcriber.transcribe_all_audios_parallel(
+        audio_files, workers=TRANSCRIBE_WORKERS, with_segments=True
+    )
+else:
+    transcriptions_dict, segment_data = transcriber.transcribe_all_audios(audio_files, with_segments=True)
+audio_data = transcriptions_dict
 
-# Load Whisper model
-device = "cuda" if torch.cuda.is_available() else "cpu"
-transcriber.whisper_model = whisper.load_model("tiny", device=device)
+# Save transcriptions (one JSON record per line)
+output_transcription_path = os.path.join(TRANSCRIPTIONS_FOLDER, "transcriptions.jsonl")
+write_jsonl(output_transcription_path, transcriptions_dict)
 
-# Transcribe audio files
-transcriptions_dict = transcriber.transcribe_all_audios(audio_files)
+print(f"Transcriptions saved to: {output_transcription_path}")
 
-# Save transcriptions
-output_transcription_path = os.path.join(TRANSCRIPTIONS_FOLDER, "transcriptions.json")
-with open(output_transcription_path, "w", encoding="utf-8") as json_file:
-    json.dump(transcriptions_dict, json_file, indent=2)
+# Save the timestamped segments, each stored as its own vector
+segments_path = os.path.join(TRANSCRIPTIONS_FOLDER, "transcription_segments.jsonl")
+segment_count = write_jsonl(segments_path, segment_data)
 
-print(f"Transcriptions saved to: {output_transcription_path}")
+print(f"{segment_count} transcription segments saved.")
 
 # Initialize PDF Processor
 pdf_processor = PDFProcessor(ESG_REPORT_PATH, IMAGE_FOLDER)
 
 # Extract structured data
 raw_data = pdf_processor.extract_raw_data()
-text_data = pdf_processor.extract_text_with_metadata()
+# Merge consecutive paragraphs of a page into token-bounded chunks before embedding
+text_data = chunk_text_records(pdf_processor.extract_text_with_metadata())
 image_data = pdf_processor.extract_image_metadata()
 table_data = pdf_processor.extract_table_metadata()
 
 # Save extracted ESG report data
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_text.json"), "w") as f:
-    json.dump(text_data, f, indent=2)
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_images.json"), "w") as f:
-    json.dump(image_data, f, indent=2)
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_tables.json"), "w") as f:
-    json.dump(table_data, f, indent=2)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_text.jsonl"), text_data)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_images.jsonl"), image_data)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_tables.jsonl"), table_data)
 
 print(f"ESG Report text, images, and tables saved.")
 
@@ -74,18 +78,18 @@ print(f"ESG Report text, images, and tables saved.")
 
 #THIS PART BELOW USES THE esg_summary.py script
 
+# Group elements by type once instead of rescanning raw_data for every summary
+elements_by_kind = split_elements(raw_data)
+
 # Extract & summarize ESG tables
-table_summary_data = extract_table_metadata_with_summary(raw_data, ESG_REPORT_PATH)
+table_summary_data = extract_table_metadata_with_summary(elements_by_kind["table"], ESG_REPORT_PATH)
 
 # Extract & summarize ESG images
-image_summary_data = extract_image_metadata_with_summary(raw_data, ESG_REPORT_PATH)
+image_summary_data = extract_image_metadata_with_summary(elements_by_kind["image"], ESG_REPORT_PATH)
 
 # Save summarized tables & images
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_table_summary.json"), "w") as f:
-    json.dump(table_summary_data, f, indent=2)
-
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_image_summary.json"), "w") as f:
-    json.dump(image_summary_data, f, indent=2)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_table_summary.jsonl"), table_summary_data)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_image_summary.jsonl"), image_summary_data)
 
 print("ESG table and image summaries saved successfully.")
 
@@ -97,19 +101,19 @@ print("ESG table and image summaries saved successfully.")
 
 
 # 2. YouTube Videos
-# Will NOT redownload YouTube videos that already exist in data/. If a video exists, it prints: "Skipping [filename], already downloaded." If a video does not exist, it will download it.
+# Will NOT redownload YouTube videos that already exist in data/. Completed downloads are recorded in data/download_manifest.json, so known URLs are skipped without contacting YouTube and print: "Skipping [filename], already downloaded." Missing videos are downloaded concurrently, keeping the source audio stream without an MP3 re-encode.
 
 # 3. Audio Transcription
-# Always runs transcription on the downloaded audio files.
+# Only runs Whisper on audio files whose content, model or decode options changed; other transcriptions come from transcription_cache/ without loading the model. Audio is decoded once into pcm_cache/, and silence and music beds are skipped before Whisper.
 
 # 4. ESG Report Processing
-# Always runs text, table, and image extraction from the PDF.
+# Reuses partition_pdf results from partition_cache/ while the PDF is unchanged, then runs text, table, and image extraction. Consecutive paragraphs of a page are merged into chunks that fit the embedding model's token limit.
 
 # 5. ESG Summarization
-# Always generates summaries for extracted tables and images.
+# Only runs Flan-T5 on tables and images it has not summarized before; other descriptions come from summary_cache/, keyed by model, prompt and table text or image bytes.
 
 # 6. JSON Data Saving
-# Always saves transcriptions, extracted ESG text, images, and tables into JSON files.
+# Always saves transcriptions, extracted ESG text, images, and tables into JSONL files (one record per line; convert older .json outputs with record_store.py).
 
 
 
@@ -122,7 +126,7 @@ from weaviate_vector_storage import reset_collection
 reset_collection()
 
 # Ingest multimodal data into Weaviate
-ingest_all_data("RAGESGDocuments", audio_data, text_data, image_data, table_data)
+ingest_all_data("RAGESGDocuments", audio_data, text_data, image_data, table_data, iter_jsonl(segments_path))
 
 
 
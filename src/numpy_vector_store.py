@@ -0,0 +1,327 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import numpy as np
+from tqdm import tqdm
+from embeddings import get_embeddings
+from lexical_index import LexicalIndex, lexical_document, reciprocal_rank_fusion
+from record_store import EmbeddingWriter, iter_batches
+from vector_storage import RECORD_KINDS, SCOPE_FIELDS, content_hash, number_tables, INGEST_BATCH_SIZE, HYBRID_CANDIDATES_PER_RESULT
+
+NUMPY_INDEX_DIR = "./numpy_index"
+
+# Low-cardinality string fields are dictionary-encoded into int32 code columns and
+# numeric fields into float64 columns (NaN when missing); both are memory-mapped and
+# filterable without touching the rows. Everything else lives in per-row JSON read on demand.
+CATEGORICAL_FIELDS = ("content_type", "source_document", "url", "audio_path")
+NUMERIC_FIELDS = {"page_number": int, "paragraph_number": int, "paragraph_end": int,
+                  "table_number": int, "start": float, "end": float}
+
+
+class NumpyIndex:
+    """
+    One immutable version of the index, opened with mmaps only.
+
+    vectors.npy      (rows, dim) L2-normalized float32
+    <field>.codes.npy / <field>.values.npy  categorical and numeric columns
+    rows.jsonl + rows.offsets.npy  remaining metadata, one JSON object per row
+    columns.json     vocabularies of the categorical columns
+    lexical.npz + lexical.rows.npy  BM25 index of the rows and the row of each of its documents
+    """
+
+    def __init__(self, version_dir):
+        self.version_dir = version_dir
+        self.vectors = np.load(os.path.join(version_dir, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(version_dir, "columns.json"), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)["vocab"]
+        self.codes = {field: self._column(f"{field}.codes.npy") for field in CATEGORICAL_FIELDS}
+        self.values = {field: self._column(f"{field}.values.npy") for field in NUMERIC_FIELDS}
+        self.offsets = self._column("rows.offsets.npy")
+        rows_path = os.path.join(version_dir, "rows.jsonl")
+        self.rows = np.memmap(rows_path, dtype=np.uint8, mode="r") if os.path.getsize(rows_path) else b""
+        self.lexical = self.lexical_rows = None
+        if os.path.exists(os.path.join(version_dir, "lexical.npz")):
+            self.lexical = LexicalIndex(os.path.join(version_dir, "lexical.npz"))
+            self.lexical_rows = self._column("lexical.rows.npy")
+
+    def _column(self, name):
+        return np.load(os.path.join(self.version_dir, name), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def metadata(self, row):
+        """Metadata dict of one row, decoded from the columns and its JSON line."""
+        record = json.loads(bytes(self.rows[self.offsets[row]:self.offsets[row + 1]]))
+        for field, codes in self.codes.items():
+            if codes[row] >= 0:
+                record[field] = self.vocab[field][codes[row]]
+        for field, kind in NUMERIC_FIELDS.items():
+            value = self.values[field][row]
+            if not np.isnan(value):
+                record[field] = kind(value)
+        return record
+
+    def mask(self, where):
+        """Boolean row mask for a Chroma-style where clause ($and, $or, $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte)."""
+        if "$and" in where:
+            return np.logical_and.reduce([self.mask(clause) for clause in where["$and"]])
+        if "$or" in where:
+            return np.logical_or.reduce([self.mask(clause) for clause in where["$or"]])
+
+        masks = []
+        for field, condition in where.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                masks.append(self._compare(field, operator, operand))
+        return np.logical_and.reduce(masks) if masks else np.ones(len(self), dtype=bool)
+
+    def _compare(self, field, operator, operand):
+        if field in self.codes:
+            vocab = self.vocab[field]
+            codes = np.asarray(self.codes[field])
+            if operator in ("$in", "$nin"):
+                wanted = [vocab.index(value) for value in operand if value in vocab]
+                matched = np.isin(codes, wanted)
+                return matched if operator == "$in" else ~matched
+            code = vocab.index(operand) if operand in vocab else -2
+            if operator == "$eq":
+                return codes == code
+            if operator == "$ne":
+                return codes != code
+        elif field in self.values:
+            values = np.asarray(self.values[field])
+            comparisons = {
+                "$eq": np.equal, "$ne": np.not_equal, "$gt": np.greater,
+                "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal,
+            }
+            if operator in comparisons:
+                return comparisons[operator](values, operand)
+            if operator in ("$in", "$nin"):
+                matched = np.isin(values, operand)
+                return matched if operator == "$in" else ~matched
+        raise ValueError(f"Unsupported filter {field} {operator} for the numpy index")
+
+    def search(self, query_vector, limit, where=None):
+        """Top-k rows by cosine similarity: one matrix product plus argpartition."""
+        if len(self) == 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = self.vectors @ (query / max(np.linalg.norm(query), 1e-12))
+        if where:
+            scores = np.where(self.mask(where), scores, -np.inf)
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = []
+        for row in top:
+            if np.isfinite(scores[row]):
+                metadata = self.metadata(row)
+                hits.append({"id": metadata["id"], "distance": float(1.0 - scores[row]), "metadata": metadata})
+        return hits
+
+    def hybrid_search(self, query, query_vector, limit, where=None):
+        """
+        Fuse the vector and BM25 rankings of limit * HYBRID_CANDIDATES_PER_RESULT candidates with
+        reciprocal rank fusion; hits carry their cosine distance and "fusion_score".
+        """
+        candidates = limit * HYBRID_CANDIDATES_PER_RESULT
+        vector_hits = self.search(query_vector, candidates, where)
+        hits = {hit["id"]: hit for hit in vector_hits}
+        lexical_ids = []
+        if self.lexical is not None:
+            allowed = self.mask(where)[self.lexical_rows] if where else None
+            unit_query = np.asarray(query_vector, dtype=np.float32)
+            unit_query = unit_query / max(np.linalg.norm(unit_query), 1e-12)
+            for record_id, _ in self.lexical.search(query, candidates, allowed):
+                lexical_ids.append(record_id)
+                if record_id not in hits:
+                    row = self.lexical_rows[self.lexical.row_of[record_id]]
+                    distance = float(1.0 - self.vectors[row] @ unit_query)
+                    hits[record_id] = {"id": record_id, "distance": distance, "metadata": self.metadata(row)}
+
+        fused = reciprocal_rank_fusion([[hit["id"] for hit in vector_hits], lexical_ids])[:limit]
+        return [{**hits[record_id], "fusion_score": score} for record_id, score in fused]
+
+
+def write_index(version_dir, rows, vectors_path):
+    """Write the columns of rows (metadata dicts with an "id") next to an existing vectors.npy."""
+    vocab = {field: [] for field in CATEGORICAL_FIELDS}
+    lookup = {field: {} for field in CATEGORICAL_FIELDS}
+    codes = {field: np.full(len(rows), -1, dtype=np.int32) for field in CATEGORICAL_FIELDS}
+    values = {field: np.full(len(rows), np.nan, dtype=np.float64) for field in NUMERIC_FIELDS}
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+
+    with open(os.path.join(version_dir, "rows.jsonl"), "wb") as f:
+        for i, row in enumerate(rows):
+            rest = {}
+            for field, value in row.items():
+                if value is None:
+                    continue
+                if field in lookup:
+                    if value not in lookup[field]:
+                        lookup[field][value] = len(vocab[field])
+                        vocab[field].append(value)
+                    codes[field][i] = lookup[field][value]
+                elif field in values:
+                    values[field][i] = value
+                else:
+                    rest[field] = value
+            line = (json.dumps(rest) + "\n").encode("utf-8")
+            f.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+
+    for field, column in codes.items():
+        np.save(os.path.join(version_dir, f"{field}.codes.npy"), column)
+    for field, column in values.items():
+        np.save(os.path.join(version_dir, f"{field}.values.npy"), column)
+    np.save(os.path.join(version_dir, "rows.offsets.npy"), offsets)
+    with open(os.path.join(version_dir, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump({"vocab": vocab}, f)
+    os.replace(vectors_path, os.path.join(version_dir, "vectors.npy"))
+
+
+class NumpyVectorIndex:
+    """
+    In-process vector index under NUMPY_INDEX_DIR.
+
+    Each ingest writes a new version directory and then atomically switches the CURRENT
+    pointer, so readers (in this or other worker processes) keep a consistent mmap of their
+    version and share its pages through the OS page cache. Searches re-open on a new version.
+    """
+
+    def __init__(self, index_dir=NUMPY_INDEX_DIR, keep_versions=2):
+        self.index_dir = index_dir
+        self.keep_versions = keep_versions
+        self._opened = None
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.index_dir, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def open(self):
+        """The current NumpyIndex, or None before the first ingest."""
+        version = self.current_version()
+        if version is None:
+            return None
+        if self._opened is None or self._opened[0] != version:
+            self._opened = (version, NumpyIndex(os.path.join(self.index_dir, version)))
+        return self._opened[1]
+
+    def ingest(self, records_by_type, batch_size=INGEST_BATCH_SIZE, embeddings_by_type=None):
+        """
+        Upsert records_by_type (content type -> iterable of records) into a new version. As in the
+        Chroma path, rows that were not seen again are only dropped within the scopes (SCOPE_FIELDS:
+        the source document or video URL) of the new records, so other documents stay and an empty
+        iterable changes nothing. Vectors of unchanged records are copied from the current version,
+        precomputed row-aligned embeddings are used when given, and the rest are encoded.
+        The lexical index is carried over from the current version, re-tokenizing changed texts only.
+        """
+        embeddings_by_type = embeddings_by_type or {}
+        current = self.open()
+        current_rows = [current.metadata(row) for row in range(len(current))] if current is not None else []
+        previous = {metadata["id"]: (row, metadata.get("content_hash")) for row, metadata in enumerate(current_rows)}
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        version = f"v-{uuid.uuid4().hex}"
+        staging_dir = tempfile.mkdtemp(dir=self.index_dir, prefix=".staging-")
+        writer = EmbeddingWriter(os.path.join(staging_dir, "vectors.tmp.npy"))
+        rows = []
+        lexical = LexicalIndex(os.path.join(current.version_dir, "lexical.npz") if current is not None else None)
+        seen_ids = set()
+        seen_scopes = set()  # (content_type, scope value) pairs present in the new records
+
+        stats = {}
+        for content_type, records in records_by_type.items():
+            id_fn, document_fn = RECORD_KINDS[content_type]
+            scope_field = SCOPE_FIELDS.get(content_type)
+            if content_type == "table":
+                records = number_tables(records)
+            sidecar = embeddings_by_type.get(content_type)
+            written = unchanged = position = 0
+
+            for batch in tqdm(iter_batches(records, batch_size), desc=f"Indexing {content_type} data"):
+                documents = [document_fn(record) for record in batch]
+                hashes = [content_hash(document) for document in documents]
+                ids = [id_fn(record) for record in batch]
+                seen_ids.update(ids)
+                if scope_field:
+                    seen_scopes.update((content_type, record.get(scope_field)) for record in batch)
+                reused = [previous.get(record_id, (None, None)) for record_id in ids]
+                missing = [i for i, (row, stored) in enumerate(reused) if row is None or stored != hashes[i]]
+                if not missing:
+                    fresh = []
+                elif sidecar is not None:
+                    fresh = np.asarray(sidecar[position:position + len(batch)], dtype=np.float32)[missing]
+                else:
+                    fresh = get_embeddings([documents[i] for i in missing], batch_size)
+                fresh = dict(zip(missing, fresh))
+
+                vectors = np.stack([
+                    np.asarray(fresh[i] if i in fresh else current.vectors[reused[i][0]], dtype=np.float32)
+                    for i in range(len(batch))
+                ])
+                vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+                writer.append(vectors)
+                lexical.update(ids, [lexical_document(record) for record in batch])
+                rows.extend({**record, "id": record_id, "content_type": content_type, "content_hash": record_hash}
+                            for record, record_id, record_hash in zip(batch, ids, hashes))
+                written += len(missing)
+                unchanged += len(batch) - len(missing)
+                position += len(batch)
+
+            stats[content_type] = {"written": written, "unchanged": unchanged, "deleted": 0}
+
+        # Keep the current rows that were neither re-ingested nor dropped from a re-ingested scope
+        kept = []
+        for row, metadata in enumerate(current_rows):
+            if metadata["id"] in seen_ids:
+                continue
+            content_type = metadata.get("content_type")
+            scope_field = SCOPE_FIELDS.get(content_type)
+            if scope_field and (content_type, metadata.get(scope_field)) in seen_scopes:
+                stats[content_type]["deleted"] += 1
+                continue
+            kept.append(row)
+        for batch in iter_batches(kept, batch_size):
+            writer.append(current.vectors[batch])
+            metadata = [current_rows[row] for row in batch]
+            lexical.update([record["id"] for record in metadata], [lexical_document(record) for record in metadata])
+            rows.extend(metadata)
+
+        for content_type, counts in stats.items():
+            print(f"{content_type}: {counts['written']} encoded, {counts['unchanged']} unchanged, "
+                  f"{counts['deleted']} deleted")
+
+        writer.close()
+        write_index(staging_dir, rows, writer.path)
+        row_of = {row["id"]: i for i, row in enumerate(rows)}
+        lexical.remove([record_id for record_id in lexical.ids if record_id not in row_of])
+        lexical.save(os.path.join(staging_dir, "lexical.npz"))
+        np.save(os.path.join(staging_dir, "lexical.rows.npy"),
+                np.array([row_of[record_id] for record_id in lexical.ids], dtype=np.int64))
+        os.replace(staging_dir, os.path.join(self.index_dir, version))
+        self._set_current(version)
+        self._remove_old_versions()
+        return stats
+
+    def _set_current(self, version):
+        fd, temp_path = tempfile.mkstemp(dir=self.index_dir, prefix=".CURRENT-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(temp_path, os.path.join(self.index_dir, "CURRENT"))
+
+    def _remove_old_versions(self):
+        """Delete versions beyond keep_versions; processes still mapping them keep their pages."""
+        versions = [name for name in os.listdir(self.index_dir) if name.startswith("v-")]
+        versions.sort(key=lambda name: os.path.getmtime(os.path.join(self.index_dir, name)), reverse=True)
+        for name in versions[self.keep_versions:]:
+            shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Inference backend for the embedding and summarization models: "torch" (fp32) or "onnx" (int8).
+# Overridden by the INFERENCE_BACKEND environment variable (or .env), read when a model is first needed.
+DEFAULT_INFERENCE_BACKEND = "torch"
+
+# Exported and quantized ONNX models, one directory per model id
+ONNX_MODEL_DIR = "./onnx_models"
+# AutoQuantizationConfig preset matching the CPU instruction set (avx2, avx512, avx512_vnni, arm64)
+ONNX_QUANTIZATION_TARGET = "avx2"
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces
+EMBEDDING_MAX_LENGTH = 256
+
+
+def inference_backend():
+    backend = os.getenv("INFERENCE_BACKEND", DEFAULT_INFERENCE_BACKEND)
+    if backend not in ("torch", "onnx"):
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}', use 'torch' or 'onnx'")
+    return backend
+
+
+def use_onnx():
+    return inference_backend() == "onnx"
+
+
+def backend_model_id(model_name):
+    """Model id used in cache keys: results of the int8 ONNX model never mix with fp32 ones."""
+    return f"{model_name}@onnx-int8" if use_onnx() else model_name
+
+
+def quantized_model_dir(model_name, ort_model_class):
+    """
+    Export model_name to ONNX and quantize every graph with int8 dynamic quantization.
+    The result is written to a staging directory and moved into ONNX_MODEL_DIR, so it is reused
+    across runs and an interrupted export is never picked up.
+    """
+    from transformers import AutoTokenizer
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    model_dir = os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "--"), f"int8-{ONNX_QUANTIZATION_TARGET}")
+    if os.path.isdir(model_dir):
+        return model_dir
+
+    print(f"Exporting {model_name} to ONNX with int8 quantization...")
+    os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=ONNX_MODEL_DIR, prefix=".staging-")
+    fp32_dir = os.path.join(staging_dir, "fp32")
+    int8_dir = os.path.join(staging_dir, "int8")
+    ort_model_class.from_pretrained(model_name, export=True).save_pretrained(fp32_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(fp32_dir)
+
+    quantization_config = getattr(AutoQuantizationConfig, ONNX_QUANTIZATION_TARGET)(is_static=False, per_channel=False)
+    os.makedirs(int8_dir)
+    for file_name in os.listdir(fp32_dir):
+        source = os.path.join(fp32_dir, file_name)
+        if file_name.endswith(".onnx"):
+            # An empty suffix keeps the file names from_pretrained expects
+            quantizer = ORTQuantizer.from_pretrained(fp32_dir, file_name=file_name)
+            quantizer.quantize(save_dir=int8_dir, quantization_config=quantization_config, file_suffix="")
+        elif os.path.isfile(source) and not os.path.exists(os.path.join(int8_dir, file_name)):
+            shutil.copy2(source, int8_dir)  # Config, generation config and tokenizer files
+
+    os.makedirs(os.path.dirname(model_dir), exist_ok=True)
+    os.replace(int8_dir, model_dir)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return model_dir
+
+
+class OnnxSentenceEncoder:
+    """
+    int8 ONNX Runtime version of a SentenceTransformer with mean pooling and L2 normalization
+    (the all-MiniLM-L6-v2 head), exposing the same encode() used by embeddings.get_embeddings.
+    """
+
+    def __init__(self, model_name):
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+
+        model_dir = quantized_model_dir(model_name, ORTModelForFeatureExtraction)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir)
+
+    def encode(self, texts, batch_size=32):
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=True,
+                max_length=EMBEDDING_MAX_LENGTH, return_tensors="np"
+            )
+            hidden = np.asarray(self.model(**inputs).last_hidden_state, dtype=np.float32)
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            vectors.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        return np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+
+def load_onnx_text_generator(model_name):
+    """text2text-generation pipeline over the int8 ONNX Runtime export of model_name."""
+    from transformers import AutoTokenizer, pipeline
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    model_dir = quantized_model_dir(model_name, ORTModelForSeq2SeqLM)
+    return pipeline(
+        "text2text-generation",
+        model=ORTModelForSeq2SeqLM.from_pretrained(model_dir),
+        tokenizer=AutoTokenizer.from_pretrained(model_dir)
+    )
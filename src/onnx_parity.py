@@ -0,0 +1,76 @@
+import sys
+import time
+import numpy as np
+from embeddings import EMBEDDING_MODEL_NAME
+from onnx_backend import OnnxSentenceEncoder
+from record_store import iter_jsonl
+
+# Corpus and queries the int8 ONNX embeddings are compared on against the fp32 PyTorch model
+PARITY_TEXTS_PATH = "transcriptions/esg_text.jsonl"
+PARITY_QUERIES = [
+    "Is ESG investment a fraud?",
+    "How did European sustainable fund flows perform in Q1 2024 compared to the previous quarter?",
+    "What is the net flows for Parnassus Mid Cap Fund?",
+]
+PARITY_TOP_K = 5
+
+
+def load_texts(path):
+    """Texts of the records in a saved JSONL file (text chunks, transcriptions or table summaries)."""
+    fields = ("text", "transcription", "description", "table_content")
+    return [next(record[field] for field in fields if record.get(field)) for record in iter_jsonl(path)
+            if any(record.get(field) for field in fields)]
+
+
+def encode_timed(model, texts):
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts), dtype=np.float32)
+    seconds = time.perf_counter() - start
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), seconds
+
+
+def top_k(query_vectors, corpus_vectors, k):
+    scores = query_vectors @ corpus_vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def parity_report(texts, queries=PARITY_QUERIES, k=PARITY_TOP_K):
+    """Compare fp32 and int8 embeddings: per-text cosine drift, top-k retrieval overlap and encode time."""
+    from sentence_transformers import SentenceTransformer
+
+    fp32_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    int8_model = OnnxSentenceEncoder(EMBEDDING_MODEL_NAME)
+
+    fp32_corpus, fp32_seconds = encode_timed(fp32_model, texts)
+    int8_corpus, int8_seconds = encode_timed(int8_model, texts)
+    drift = 1.0 - np.sum(fp32_corpus * int8_corpus, axis=1)
+
+    k = min(k, len(texts))
+    fp32_hits = top_k(encode_timed(fp32_model, queries)[0], fp32_corpus, k)
+    int8_hits = top_k(encode_timed(int8_model, queries)[0], int8_corpus, k)
+    overlaps = [len(a & b) / k for a, b in zip(fp32_hits, int8_hits)]
+
+    return {
+        "texts": len(texts),
+        "mean_cosine_drift": float(drift.mean()),
+        "max_cosine_drift": float(drift.max()),
+        "top_k": k,
+        "mean_top_k_overlap": float(np.mean(overlaps)),
+        "min_top_k_overlap": float(np.min(overlaps)),
+        "fp32_seconds": fp32_seconds,
+        "int8_seconds": int8_seconds,
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python onnx_parity.py [texts.jsonl] [top_k]
+    texts_path = sys.argv[1] if len(sys.argv) > 1 else PARITY_TEXTS_PATH
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else PARITY_TOP_K
+    report = parity_report(load_texts(texts_path), PARITY_QUERIES, k)
+
+    print(f"Embedding parity on {report['texts']} texts from {texts_path}")
+    print(f"Cosine drift (1 - cos): mean {report['mean_cosine_drift']:.5f}, max {report['max_cosine_drift']:.5f}")
+    print(f"Top-{report['top_k']} overlap: mean {report['mean_top_k_overlap']:.0%}, "
+          f"min {report['min_top_k_overlap']:.0%} over {len(PARITY_QUERIES)} queries")
+    print(f"Encode time: fp32 {report['fp32_seconds']:.2f}s, int8 {report['int8_seconds']:.2f}s "
+          f"({report['fp32_seconds'] / max(report['int8_seconds'], 1e-9):.1f}x)")
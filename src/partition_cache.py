@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from disk_cache import file_sha256
+
+PARTITION_CACHE_DIR = "./partition_cache"
+PARTITION_CACHE_MAX_ENTRIES = 8
+
+
+class PartitionCache:
+    """
+    Persistent cache of partition_pdf results.
+
+    Each entry is a directory named after the PDF content hash plus the partition
+    options, holding the serialized elements and the image files extracted from the
+    PDF. Entries are evicted least recently used first beyond max_entries.
+    """
+
+    def __init__(self, cache_dir=PARTITION_CACHE_DIR, max_entries=PARTITION_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def key(self, pdf_path, options):
+        """Cache key for a PDF file and the options it is partitioned with."""
+        options_hash = hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{file_sha256(pdf_path)[:32]}-{options_hash[:16]}"
+
+    def load(self, key, image_dir):
+        """Return the cached elements for key with their images restored into image_dir, or None."""
+        from unstructured.staging.base import elements_from_json
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        elements_path = os.path.join(entry_dir, "elements.json")
+        if not os.path.exists(elements_path):
+            return None
+
+        elements = elements_from_json(filename=elements_path)
+        os.makedirs(image_dir, exist_ok=True)
+        for element in elements:
+            image_name = getattr(element.metadata, "image_path", None)
+            if not image_name:
+                continue
+            cached_image = os.path.join(entry_dir, "images", image_name)
+            if os.path.isabs(image_name) or not os.path.exists(cached_image):
+                continue  # The image was missing when stored; keep the path partition_pdf reported
+            # Always write the cached bytes: figure names (figure-<page>-<n>.jpg) repeat across PDFs,
+            # so a file of the same name in image_dir may belong to another document
+            restored_path = os.path.join(image_dir, image_name)
+            shutil.copy2(cached_image, restored_path)
+            element.metadata.image_path = restored_path
+
+        # Mark as recently used for eviction
+        os.utime(entry_dir)
+        return elements
+
+    def store(self, key, elements):
+        """Serialize elements and copy their extracted images into a new cache entry."""
+        from unstructured.staging.base import elements_to_json
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".staging-")
+        os.makedirs(os.path.join(staging_dir, "images"))
+
+        # Images are stored by file name only; load() points them at the caller's image_dir
+        original_paths = []
+        for element in elements:
+            image_path = getattr(element.metadata, "image_path", None)
+            original_paths.append(image_path)
+            if image_path and os.path.exists(image_path):
+                shutil.copy2(image_path, os.path.join(staging_dir, "images", os.path.basename(image_path)))
+                element.metadata.image_path = os.path.basename(image_path)
+        try:
+            elements_to_json(elements, filename=os.path.join(staging_dir, "elements.json"))
+        finally:
+            for element, image_path in zip(elements, original_paths):
+                element.metadata.image_path = image_path
+
+        entry_dir = os.path.join(self.cache_dir, key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(staging_dir, entry_dir)
+        self.evict()
+
+    def entries(self):
+        """Cache entry names, least recently used first."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        names = [name for name in os.listdir(self.cache_dir) if not name.startswith(".")]
+        return sorted(names, key=lambda name: os.path.getmtime(os.path.join(self.cache_dir, name)))
+
+    def evict(self):
+        """Remove the least recently used entries beyond max_entries."""
+        entries = self.entries()
+        for name in entries[:max(0, len(entries) - self.max_entries)]:
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def clear(self):
+        """Remove every cache entry."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # Usage: python partition_cache.py [list|clear]
+    cache = PartitionCache()
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "clear":
+        cache.clear()
+        print(f"Partition cache {cache.cache_dir} cleared.")
+    elif command == "list":
+        for name in cache.entries():
+            last_used = time.ctime(os.path.getmtime(os.path.join(cache.cache_dir, name)))
+            print(f"{name}  last used {last_used}")
+    else:
+        print(f"Unknown command: {command}. Use 'list' or 'clear'.")
+        sys.exit(1)
@@ -1,68 +1,284 @@
 import os
 import math
 import json
-import matplotlib.pyplot as plt
-from PIL import Image
-from unstructured.partition.pdf import partition_pdf
-from unstructured.documents.elements import NarrativeText, Image, Table
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from element_router import ElementRouter, ListSink, JSONLSink
+from partition_cache import PartitionCache
+
+# Options shared by the serial and the page-sharded partitioning
+PARTITION_OPTIONS = {
+    "strategy": "hi_res",
+    "extract_images_in_pdf": True,
+    "extract_image_block_to_payload": False,
+}
+
+# Adaptive strategy: pages with fewer text-layer characters than MIN_TEXT_CHARS are treated
+# as scanned, and pages with embedded images or more than MAX_FAST_GRAPHICS vector
+# graphics (lines, rectangles, curves of charts and tables) need layout detection.
+MIN_TEXT_CHARS = 20
+MAX_FAST_GRAPHICS = 10
+
+# Extracted image files are named "<figure|table>-<page>-<n>.jpg", n counting per document
+EXTRACTED_IMAGE_NAME = re.compile(r"^(figure|table)-\d+-\d+\.jpg$")
+
+
+def inspect_pages(pdf_path):
+    """Cheap per-page stats from the PDF content stream: text-layer characters, images and vector graphics."""
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.layout import LTChar, LTContainer, LTCurve, LTImage
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    page_stats = []
+    with open(pdf_path, "rb") as pdf_file:
+        resource_manager = PDFResourceManager()
+        # No layout analysis: only the raw objects of each page are needed
+        device = PDFPageAggregator(resource_manager, laparams=None)
+        interpreter = PDFPageInterpreter(resource_manager, device)
+
+        for page_number, page in enumerate(PDFPage.get_pages(pdf_file), start=1):
+            interpreter.process_page(page)
+            stats = {"page_number": page_number, "chars": 0, "images": 0, "graphics": 0}
+            pending = [device.get_result()]
+            while pending:
+                layout_object = pending.pop()
+                if isinstance(layout_object, LTChar):
+                    stats["chars"] += 1
+                elif isinstance(layout_object, LTImage):
+                    stats["images"] += 1
+                elif isinstance(layout_object, LTCurve):
+                    stats["graphics"] += 1
+                if isinstance(layout_object, LTContainer):
+                    pending.extend(layout_object)
+            page_stats.append(stats)
+    return page_stats
+
+
+def choose_strategy(stats):
+    """Pick the partition strategy for a page from its inspect_pages stats; returns (strategy, reason)."""
+    if stats["chars"] < MIN_TEXT_CHARS:
+        return "hi_res", "no text layer"
+    if stats["images"]:
+        return "hi_res", f"{stats['images']} images"
+    if stats["graphics"] > MAX_FAST_GRAPHICS:
+        return "hi_res", f"{stats['graphics']} vector graphics"
+    return "fast", "plain text"
+
+
+def partition_page_range(pdf_path, first_page, last_page, image_dir, options):
+    """
+    Partition pages first_page..last_page (1-based, inclusive) of a PDF; runs in a worker process.
+    Returns the elements and the seconds spent partitioning.
+    """
+    from pypdf import PdfReader, PdfWriter
+    from unstructured.partition.pdf import partition_pdf
+
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for page_index in range(first_page - 1, last_page):
+        writer.add_page(reader.pages[page_index])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shard_path = os.path.join(temp_dir, os.path.basename(pdf_path))
+        with open(shard_path, "wb") as shard_file:
+            writer.write(shard_file)
+
+        start = time.perf_counter()
+        elements = partition_pdf(
+            filename=shard_path,
+            starting_page_number=first_page,
+            extract_image_block_output_dir=image_dir,
+            **options
+        )
+        seconds = time.perf_counter() - start
+
+    # Point the metadata back at the original document instead of the temporary shard
+    for element in elements:
+        element.metadata.file_directory = os.path.dirname(pdf_path)
+    return elements, seconds
+
 
 class PDFProcessor:
-    def __init__(self, pdf_path, output_image_dir):
+    def __init__(self, pdf_path, output_image_dir, workers=1, pages_per_shard=4, use_cache=True, adaptive=False):
+        """
+        workers > 1 partitions page ranges of pages_per_shard pages in a process pool.
+        use_cache reuses partition_pdf results of an unchanged PDF from the partition cache.
+        adaptive partitions plain text pages with the "fast" strategy and the rest with "hi_res".
+        """
         self.pdf_path = pdf_path
         self.output_image_dir = output_image_dir
+        self.workers = workers
+        self.pages_per_shard = pages_per_shard
+        self.adaptive = adaptive
+        self.page_report = []
+        self.partition_cache = PartitionCache() if use_cache else None
         os.makedirs(self.output_image_dir, exist_ok=True)
         self.raw_data = None
+        self._routed_source = None
+        self._routed_records = None
 
     def extract_raw_data(self):
-        """Partition PDF into structured elements."""
-        self.raw_data = partition_pdf(
-            filename=self.pdf_path,
-            strategy="hi_res",
-            extract_images_in_pdf=True,
-            extract_image_block_to_payload=False,
-            extract_image_block_output_dir=self.output_image_dir
-        )
+        """Partition PDF into structured elements, reusing cached results for an unchanged PDF."""
+        from unstructured.partition.pdf import partition_pdf
+
+        if self.partition_cache:
+            cache_key = self.partition_cache.key(self.pdf_path, {**PARTITION_OPTIONS, "adaptive": self.adaptive})
+            cached = self.partition_cache.load(cache_key, self.output_image_dir)
+            if cached is not None:
+                print(f"Loaded partitioned {self.pdf_path} from cache.")
+                self.raw_data = cached
+                return self.raw_data
+
+        if self.adaptive:
+            self.raw_data = self.partition_adaptive()
+        elif self.workers > 1:
+            self.raw_data = self.partition_parallel()
+        else:
+            self.raw_data = partition_pdf(
+                filename=self.pdf_path,
+                extract_image_block_output_dir=self.output_image_dir,
+                **PARTITION_OPTIONS
+            )
+
+        if self.partition_cache:
+            self.partition_cache.store(cache_key, self.raw_data)
         return self.raw_data
 
-    def extract_text_with_metadata(self):
-        """Extract structured text with metadata."""
-        text_data = []
-        paragraph_counters = {}
+    def count_pages(self):
+        """Number of pages in the PDF."""
+        from pypdf import PdfReader
+        return len(PdfReader(self.pdf_path).pages)
+
+    def page_ranges(self):
+        """Split the document into (first_page, last_page) shards of pages_per_shard pages."""
+        page_count = self.count_pages()
+        return [
+            (first_page, min(first_page + self.pages_per_shard - 1, page_count))
+            for first_page in range(1, page_count + 1, self.pages_per_shard)
+        ]
+
+    def partition_parallel(self):
+        """Partition page ranges in a process pool and merge the elements back in page order."""
+        return [element for shard, _ in self.iter_shards(self.page_ranges()) for element in shard]
+
+    def partition_adaptive(self):
+        """
+        Partition every page with the strategy chosen from its inspect_pages stats.
+        Per-page decisions and timings are kept in self.page_report.
+        """
+        page_stats = inspect_pages(self.pdf_path)
+        strategies = [choose_strategy(stats) for stats in page_stats]
+        shards = [(stats["page_number"], stats["page_number"]) for stats in page_stats]
+        options = [{**PARTITION_OPTIONS, "strategy": strategy} for strategy, _ in strategies]
 
-        for element in self.raw_data:
-            if isinstance(element, NarrativeText):
-                page_number = element.metadata.page_number
+        elements = []
+        self.page_report = []
+        for stats, (strategy, reason), (page_elements, seconds) in zip(
+            page_stats, strategies, self.iter_shards(shards, options)
+        ):
+            elements.extend(page_elements)
+            self.page_report.append({**stats, "strategy": strategy, "reason": reason, "seconds": seconds})
+        self.print_page_report()
+        return elements
 
-                if page_number not in paragraph_counters:
-                    paragraph_counters[page_number] = 1
-                else:
-                    paragraph_counters[page_number] += 1
+    def print_page_report(self):
+        """Print the per-page strategy decisions and timings of the last adaptive run."""
+        for page in self.page_report:
+            print(f"Page {page['page_number']:>3}: {page['strategy']:<7} {page['seconds']:6.2f}s  ({page['reason']})")
+        for strategy in ("fast", "hi_res"):
+            pages = [page for page in self.page_report if page["strategy"] == strategy]
+            if pages:
+                print(f"{strategy}: {len(pages)} pages, {sum(page['seconds'] for page in pages):.2f}s")
 
-                paragraph_number = paragraph_counters[page_number]
+    def iter_shards(self, shards, shard_options=None):
+        """
+        Partition (first_page, last_page) shards and yield (elements, seconds) shard by shard, in page order.
+        shard_options gives the partition options of each shard (default PARTITION_OPTIONS).
+        """
+        shard_options = shard_options or [PARTITION_OPTIONS] * len(shards)
+        shard_dirs = [
+            os.path.join(self.output_image_dir, f".shard-{first_page}-{last_page}")
+            for first_page, last_page in shards
+        ]
+        counters = {}
 
-                text_data.append({
-                    "source_document": self.pdf_path,
-                    "page_number": page_number,
-                    "paragraph_number": paragraph_number,
-                    "text": element.text
-                })
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            shard_elements = executor.map(
+                partition_page_range,
+                [self.pdf_path] * len(shards),
+                [first_page for first_page, _ in shards],
+                [last_page for _, last_page in shards],
+                shard_dirs,
+                shard_options
+            )
+            for shard_dir, (elements, seconds) in zip(shard_dirs, shard_elements):
+                self.renumber_extracted_images(elements, counters)
+                shutil.rmtree(shard_dir, ignore_errors=True)
+                yield elements, seconds
 
-        return text_data
+    def renumber_extracted_images(self, elements, counters):
+        """
+        Move images extracted by the shards into output_image_dir, renamed as a single
+        serial pass would name them (the figure counter runs over the whole document).
+        """
+        for element in elements:
+            image_path = getattr(element.metadata, "image_path", None)
+            if not image_path or not EXTRACTED_IMAGE_NAME.match(os.path.basename(image_path)):
+                continue
+
+            basename = os.path.basename(image_path).split("-")[0]
+            counters[basename] = counters.get(basename, 0) + 1
+            final_path = os.path.join(
+                self.output_image_dir, f"{basename}-{element.metadata.page_number}-{counters[basename]}.jpg"
+            )
+            shutil.move(image_path, final_path)
+            element.metadata.image_path = final_path
+
+    def route_raw_data(self):
+        """Route raw_data once into text, image and table records; reused until raw_data changes."""
+        if self._routed_source is not self.raw_data:
+            sinks = {"text": ListSink(), "image": ListSink(), "table": ListSink()}
+            router = ElementRouter(self.pdf_path, sinks)
+            router.route_all(self.raw_data)
+            router.close()
+            self._routed_source = self.raw_data
+            self._routed_records = {kind: sink.records for kind, sink in sinks.items()}
+        return self._routed_records
+
+    def stream_to_jsonl(self, text_path, image_path, table_path):
+        """
+        Partition the PDF page by page and route every element straight to JSONL files.
+
+        Only one page of elements and records is held at a time; raw_data is not kept.
+        Returns the number of records written per kind.
+        """
+        sinks = {"text": JSONLSink(text_path), "image": JSONLSink(image_path), "table": JSONLSink(table_path)}
+        router = ElementRouter(self.pdf_path, sinks)
+        page_shards = [(page, page) for page in range(1, self.count_pages() + 1)]
+        try:
+            for elements, _ in self.iter_shards(page_shards):
+                router.route_all(elements)
+        finally:
+            router.close()
+        return {kind: sink.count for kind, sink in sinks.items()}
+
+    def extract_text_with_metadata(self):
+        """Extract structured text with metadata."""
+        return self.route_raw_data()["text"]
 
     def extract_image_metadata(self):
         """Extract image metadata from the report."""
-        image_data = []
-        for element in self.raw_data:
-            if "Image" in str(type(element)):
-                image_data.append({
-                    "source_document": self.pdf_path,
-                    "page_number": element.metadata.page_number,
-                    "image_path": getattr(element.metadata, "image_path", None)
-                })
-        return image_data
+        return self.route_raw_data()["image"]
 
     def display_images(self, extracted_image_data, images_per_row=4):
         """Display extracted images in a grid format."""
+        import matplotlib.pyplot as plt
+        from PIL import Image
+
         valid_images = [img for img in extracted_image_data if img['image_path']]
         if not valid_images:
             print("No valid image data available.")
@@ -92,12 +308,4 @@ class PDFProcessor:
 
     def extract_table_metadata(self):
         """Extract tables from the ESG report."""
-        table_data = []
-        for element in self.raw_data:
-            if isinstance(element, Table):
-                table_data.append({
-                    "source_document": self.pdf_path,
-                    "page_number": element.metadata.page_number,
-                    "table_content": str(element)
-                })
-        return table_data
+        return self.route_raw_data()["table"]
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from itertools import islice
+import numpy as np
+
+# Pipeline intermediates are JSONL files (one record per line) with an optional
+# row-aligned float32 embedding matrix next to them: esg_text.jsonl + esg_text.<model hash>.npy
+
+
+def write_jsonl(path, records, append=False):
+    """Write records one per line and return how many were written; a rewrite replaces the file atomically."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    if append:
+        with open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+                count += 1
+        return count
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".jsonl.tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    os.replace(temp_path, path)
+    return count
+
+
+def iter_jsonl(path):
+    """Yield the records of a JSONL file one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_batches(records, batch_size):
+    """Yield lists of up to batch_size records from any iterable."""
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def embeddings_path(jsonl_path, model_id):
+    """Sidecar embedding matrix of a JSONL file for one embedding model (and backend)."""
+    model_hash = hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:12]
+    return f"{os.path.splitext(jsonl_path)[0]}.{model_hash}.npy"
+
+
+class EmbeddingWriter:
+    """
+    Appends float32 rows to a sidecar .npy file. Rows stream to a temp file and the .npy
+    header is written on close, once the row count is known, so memory stays bounded by a batch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.dim = None
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        self._raw = tempfile.TemporaryFile(dir=directory)
+
+    def append(self, vectors):
+        vectors = np.asarray(vectors, dtype="<f4")
+        if len(vectors) == 0:
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        self._raw.write(vectors.tobytes())
+        self.rows += len(vectors)
+
+    def close(self):
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.lib.format.write_array_header_1_0(
+                f, {"descr": "<f4", "fortran_order": False, "shape": (self.rows, self.dim or 0)}
+            )
+            self._raw.seek(0)
+            for chunk in iter(lambda: self._raw.read(1024 * 1024), b""):
+                f.write(chunk)
+        self._raw.close()
+        os.replace(temp_path, self.path)
+
+
+def load_embeddings(jsonl_path, model_id):
+    """Memory-mapped sidecar matrix of jsonl_path, or None if missing or older than the records."""
+    path = embeddings_path(jsonl_path, model_id)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(jsonl_path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def convert_json_to_jsonl(json_path, jsonl_path=None):
+    """Convert a JSON array file written by earlier runs into JSONL next to it."""
+    jsonl_path = jsonl_path or os.path.splitext(json_path)[0] + ".jsonl"
+    with open(json_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    count = write_jsonl(jsonl_path, records)
+    print(f"{json_path} -> {jsonl_path} ({count} records)")
+    return jsonl_path
+
+
+if __name__ == "__main__":
+    # Usage: python record_store.py file.json [file.json ...]
+    if len(sys.argv) < 2:
+        print("Usage: python record_store.py file.json [file.json ...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        convert_json_to_jsonl(path)
@@ -0,0 +1,111 @@
+import time
+import resources
+from lexical_index import lexical_document
+from query_cache import TTLCache
+
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Over-fetched candidates, hits kept for generation, and the time the stage may take
+RERANK_CANDIDATES = 30
+RERANK_TOP_K = 5
+RERANK_LATENCY_BUDGET_SECONDS = 0.25
+
+# Starting estimate of the forward-pass cost per (query, candidate) pair, refined after every pass
+RERANK_INITIAL_SECONDS_PER_PAIR = 0.005
+RERANK_COST_SMOOTHING = 0.3
+
+
+def _load_rerank_model():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL_NAME)
+
+resources.register("rerank_model", _load_rerank_model)
+
+
+# Helper: text the cross-encoder reads for a hit (images fall back to their path)
+def candidate_text(metadata):
+    return lexical_document(metadata) or metadata.get("image_path", "")
+
+
+class Reranker:
+    """
+    Re-orders over-fetched search hits with a cross-encoder, scoring all uncached
+    (query, candidate) pairs in one batched forward pass.
+
+    Scores are cached per (query, doc id, content hash). To stay within budget_seconds,
+    only the best-ranked candidates the measured per-pair cost allows are scored; cached
+    ones are free. The remaining candidates keep their retrieval order after the scored ones.
+    """
+
+    def __init__(self, budget_seconds=RERANK_LATENCY_BUDGET_SECONDS, cache_entries=4096, cache_ttl_seconds=3600):
+        self.budget_seconds = budget_seconds
+        self.seconds_per_pair = RERANK_INITIAL_SECONDS_PER_PAIR
+        self.score_cache = TTLCache(max_entries=cache_entries, ttl_seconds=cache_ttl_seconds)
+
+    def affordable_pairs(self):
+        return max(1, int(self.budget_seconds / self.seconds_per_pair))
+
+    def rerank(self, query, hits, limit=RERANK_TOP_K):
+        """
+        Rerank search hits ({"id", "distance", "metadata"} dicts) and keep the first limit
+        (all with limit=None). Returns {"hits", "seconds", "candidates", "scored", "cached",
+        "position_changes"}; position changes are {"id", "from", "to"} for the kept hits that moved.
+        """
+        start = time.perf_counter()
+        keys = [(query, hit["id"], hit["metadata"].get("content_hash")) for hit in hits]
+        affordable = self.affordable_pairs()
+        scores = {}
+        uncached = []
+        scored_until = len(hits)
+        for position, key in enumerate(keys):
+            score = self.score_cache.get(key)
+            if score is not None:
+                scores[position] = score
+            elif len(uncached) < affordable:
+                uncached.append(position)
+            else:
+                scored_until = position  # Out of budget: this and the lower-ranked candidates keep their order
+                break
+
+        if uncached:
+            rerank_model = resources.get("rerank_model")  # Loaded before timing, so the load is not a pass cost
+            pairs = [(query, candidate_text(hits[position]["metadata"])) for position in uncached]
+            pass_start = time.perf_counter()
+            new_scores = rerank_model.predict(pairs, batch_size=len(pairs))
+            # Exponential moving average, so one slow pass cannot shrink the candidates for long
+            measured = (time.perf_counter() - pass_start) / len(pairs)
+            self.seconds_per_pair = (1 - RERANK_COST_SMOOTHING) * self.seconds_per_pair + RERANK_COST_SMOOTHING * measured
+            for position, score in zip(uncached, new_scores):
+                scores[position] = float(score)
+                self.score_cache.set(keys[position], float(score))
+
+        order = sorted(range(scored_until), key=lambda position: scores[position], reverse=True)
+        order += range(scored_until, len(hits))
+        if limit is not None:
+            order = order[:limit]
+
+        reranked = []
+        position_changes = []
+        for new_position, position in enumerate(order):
+            hit = hits[position]
+            if position in scores:
+                hit = {**hit, "rerank_score": scores[position]}
+            reranked.append(hit)
+            if new_position != position:
+                position_changes.append({"id": hit["id"], "from": position, "to": new_position})
+
+        return {
+            "hits": reranked,
+            "seconds": time.perf_counter() - start,
+            "candidates": len(hits),
+            "scored": len(uncached),
+            "cached": len(scores) - len(uncached),
+            "position_changes": position_changes,
+        }
+
+
+resources.register("reranker", Reranker)
+
+
+def get_reranker():
+    return resources.get("reranker")
@@ -0,0 +1,48 @@
+import threading
+
+# Process-wide registry of lazily created models and clients.
+# Modules register a zero-argument factory at import time; the resource is only
+# built on the first get() and then shared. Tests can override() a resource with a stub.
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+
+def register(name, factory):
+    """Register the factory that builds resource `name` on first use."""
+    with _lock:
+        _factories[name] = factory
+
+
+def get(name):
+    """Return resource `name`, creating it on first use."""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"No resource registered under '{name}'")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def override(name, instance):
+    """Inject an already built resource, e.g. a stub model in tests."""
+    with _lock:
+        _instances[name] = instance
+
+
+def is_loaded(name):
+    """Whether resource `name` has been created or injected."""
+    return name in _instances
+
+
+def reset(name=None):
+    """Forget one resource (or all of them) so the next get() rebuilds it."""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
@@ -1,12 +1,13 @@
-import json
 import os
-import torch
-import whisper
 from downloader import YouTubeAudioDownloader
 from transcriber import AudioTranscriber
+from text_chunker import chunk_text_records
 from pdf_processor import PDFProcessor
+from element_router import split_elements
+from record_store import write_jsonl, iter_jsonl, load_embeddings
+from embeddings import embed_jsonl, embedding_model_id
 from esg_summary import extract_table_metadata_with_summary, extract_image_metadata_with_summary
-from vector_storage import ingest_all_data
+from vector_store import get_vector_store
 from esg_analysis import analyze_and_print_esg_results
 
 # Set paths
@@ -14,6 +15,7 @@ DATA_FOLDER = "data"
 TRANSCRIPTIONS_FOLDER = "transcriptions"
 ESG_REPORT_PATH = "data/Global_ESG_Flows_Q1_2024_Report.pdf"
 IMAGE_FOLDER = "data/images"
+TRANSCRIBE_WORKERS = 2
 os.makedirs(TRANSCRIPTIONS_FOLDER, exist_ok=True)
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
 
@@ -27,82 +29,88 @@ video_urls = [
 ]
 
 # Download audios, skipping existing files
-audio_files = downloader.download_multiple_audios(video_urls)
+audio_files = downloader.download_multiple_audios(video_urls, concurrent=True)
 
-# Initialize transcriber
-transcriber = AudioTranscriber(input_folder=DATA_FOLDER)
+# Initialize transcriber (Whisper "tiny" on GPU when available)
+transcriber = AudioTranscriber(input_folder=DATA_FOLDER, model_name="tiny")
 
-# audio_data is directly returned from transcribe_all_audios()
-audio_data = transcriber.transcribe_all_audios(audio_files)
+# Transcribe audio files once into full transcripts and timestamped segments;
+# on CPU each worker process loads the model once
+if transcriber.device == "cpu":
+    transcriptions_dict, segment_data = transcriber.transcribe_all_audios_parallel(
+        audio_files, workers=TRANSCRIBE_WORKERS, with_segments=True
+    )
+else:
+    transcriptions_dict, segment_data = transcriber.transcribe_all_audios(audio_files, with_segments=True)
+audio_data = transcriptions_dict
 
-# Load Whisper model
-device = "cuda" if torch.cuda.is_available() else "cpu"
-transcriber.whisper_model = whisper.load_model("tiny", device=device)
+# Save transcriptions (one JSON record per line)
+output_transcription_path = os.path.join(TRANSCRIPTIONS_FOLDER, "transcriptions.jsonl")
+write_jsonl(output_transcription_path, transcriptions_dict)
 
-# Transcribe audio files
-transcriptions_dict = transcriber.transcribe_all_audios(audio_files)
+print(f"Transcriptions saved to: {output_transcription_path}")
 
-# Save transcriptions
-output_transcription_path = os.path.join(TRANSCRIPTIONS_FOLDER, "transcriptions.json")
-with open(output_transcription_path, "w", encoding="utf-8") as json_file:
-    json.dump(transcriptions_dict, json_file, indent=2)
+# Save the timestamped segments, each stored as its own vector
+segments_path = os.path.join(TRANSCRIPTIONS_FOLDER, "transcription_segments.jsonl")
+segment_count = write_jsonl(segments_path, segment_data)
 
-print(f"Transcriptions saved to: {output_transcription_path}")
+print(f"{segment_count} transcription segments saved.")
 
 # Initialize PDF Processor
 pdf_processor = PDFProcessor(ESG_REPORT_PATH, IMAGE_FOLDER)
 
 # Extract structured data
 raw_data = pdf_processor.extract_raw_data()
-text_data = pdf_processor.extract_text_with_metadata()
+# Merge consecutive paragraphs of a page into token-bounded chunks before embedding
+text_data = chunk_text_records(pdf_processor.extract_text_with_metadata())
 image_data = pdf_processor.extract_image_metadata()
 table_data = pdf_processor.extract_table_metadata()
 
 # Save extracted ESG report data
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_text.json"), "w") as f:
-    json.dump(text_data, f, indent=2)
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_images.json"), "w") as f:
-    json.dump(image_data, f, indent=2)
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_tables.json"), "w") as f:
-    json.dump(table_data, f, indent=2)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_text.jsonl"), text_data)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_images.jsonl"), image_data)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_tables.jsonl"), table_data)
 
 print(f"ESG Report text, images, and tables saved.")
 
+# Group elements by type once instead of rescanning raw_data for every summary
+elements_by_kind = split_elements(raw_data)
+
 # Extract & summarize ESG tables
-table_summary_data = extract_table_metadata_with_summary(raw_data, ESG_REPORT_PATH)
+table_summary_data = extract_table_metadata_with_summary(elements_by_kind["table"], ESG_REPORT_PATH)
 
 # Extract & summarize ESG images
-image_summary_data = extract_image_metadata_with_summary(raw_data, ESG_REPORT_PATH)
+image_summary_data = extract_image_metadata_with_summary(elements_by_kind["image"], ESG_REPORT_PATH)
 
 # Save summarized tables & images
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_table_summary.json"), "w") as f:
-    json.dump(table_summary_data, f, indent=2)
-
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_image_summary.json"), "w") as f:
-    json.dump(image_summary_data, f, indent=2)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_table_summary.jsonl"), table_summary_data)
+write_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_image_summary.jsonl"), image_summary_data)
 
 print("ESG table and image summaries saved successfully.")
 
-# Load previously processed data from JSON files for ingestion into ChromaDB
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "transcriptions.json"), "r") as f:
-    audio_data = json.load(f)
-
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_text.json"), "r") as f:
-    text_data = json.load(f)
-
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_images.json"), "r") as f:
-    image_data = json.load(f)
+# Stream previously processed data from the JSONL files into the vector store; ingestion starts on the
+# first record and only one batch is held in memory. Text vectors are computed once into a
+# row-aligned sidecar matrix and read back memory-mapped.
+text_path = os.path.join(TRANSCRIPTIONS_FOLDER, "esg_text.jsonl")
+embed_jsonl(text_path, "text")
+text_embeddings = load_embeddings(text_path, embedding_model_id())
 
-with open(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_tables.json"), "r") as f:
-    table_data = json.load(f)
+audio_data = iter_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "transcriptions.jsonl"))
+audio_segment_data = iter_jsonl(segments_path)
+text_data = iter_jsonl(text_path)
+image_data = iter_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_images.jsonl"))
+table_data = iter_jsonl(os.path.join(TRANSCRIPTIONS_FOLDER, "esg_tables.jsonl"))
 
 # THIS PART IS ABOUT DATA STORAGE
-print("Ingesting multimodal ESG data into ChromaDB...")
+# VECTOR_STORE_BACKEND selects ChromaDB (default), Weaviate or the in-process numpy index
+vector_store = get_vector_store()
+print(f"Ingesting multimodal ESG data into the {vector_store.name} vector store...")
 
-# Store all ESG data into ChromaDB
-ingest_all_data(audio_data, text_data, image_data, table_data)
+# Store all ESG data into the vector store esg_analysis searches
+vector_store.ingest_all_data(audio_data, text_data, image_data, table_data,
+                             audio_segment_data=audio_segment_data, text_embeddings=text_embeddings)
 
-print("Data ingestion into ChromaDB completed successfully.")
+print("Data ingestion completed successfully.")
 
 # ESG Analysis
 print("\nRunning ESG analysis for user queries...\n")
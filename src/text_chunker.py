@@ -0,0 +1,97 @@
+import resources
+from embeddings import EMBEDDING_MODEL_NAME
+
+# all-MiniLM-L6-v2 truncates input at 256 word pieces; leave room for [CLS] and [SEP]
+CHUNK_MAX_TOKENS = 254
+CHUNK_OVERLAP_TOKENS = 0
+
+# Tokenizer of the embedding model, loaded on first use (much lighter than the model itself)
+def _load_tokenizer():
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+
+resources.register("chunk_tokenizer", _load_tokenizer)
+
+def count_tokens(texts):
+    """Number of word pieces of each text, without special tokens."""
+    if not texts:
+        return []
+    encoded = resources.get("chunk_tokenizer")(texts, add_special_tokens=False)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def group_by_page(text_data):
+    """Split paragraph records into runs of consecutive records from the same document page."""
+    group = []
+    for record in text_data:
+        if group and (record["source_document"], record["page_number"]) != (
+                group[-1]["source_document"], group[-1]["page_number"]):
+            yield group
+            group = []
+        group.append(record)
+    if group:
+        yield group
+
+
+def make_chunk(paragraphs):
+    first, last = paragraphs[0], paragraphs[-1]
+    return {
+        "source_document": first["source_document"],
+        "page_number": first["page_number"],
+        "paragraph_number": first["paragraph_number"],
+        "paragraph_end": last.get("paragraph_end", last["paragraph_number"]),
+        "text": "\n\n".join(paragraph["text"] for paragraph in paragraphs)
+    }
+
+
+def chunk_page(paragraphs, token_counts, max_tokens, overlap_tokens):
+    """
+    Greedily pack consecutive paragraphs into chunks of at most max_tokens.
+    A paragraph longer than max_tokens becomes a chunk of its own. With overlap_tokens,
+    each chunk starts with the trailing paragraphs of the previous one that fit in it.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for paragraph, tokens in zip(paragraphs, token_counts):
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(make_chunk([p for p, _ in current]))
+
+            # Carry trailing paragraphs over while they fit the overlap and leave room for this one
+            carried, carried_tokens = [], 0
+            for previous, previous_tokens in reversed(current):
+                if carried_tokens + previous_tokens > min(overlap_tokens, max_tokens - tokens):
+                    break
+                carried.insert(0, (previous, previous_tokens))
+                carried_tokens += previous_tokens
+            current, current_tokens = carried, carried_tokens
+
+        current.append((paragraph, tokens))
+        current_tokens += tokens
+
+    if current:
+        chunks.append(make_chunk([p for p, _ in current]))
+    return chunks
+
+
+def chunk_text_records(text_data, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Merge consecutive paragraph records of the same page into token-bounded chunks.
+
+    Chunks keep source_document and page_number, with paragraph_number..paragraph_end
+    as the range of paragraphs they cover, so citations still point at the page.
+    """
+    text_data = list(text_data)
+    chunks = []
+    for paragraphs in group_by_page(text_data):
+        token_counts = count_tokens([paragraph["text"] for paragraph in paragraphs])
+        chunks.extend(chunk_page(paragraphs, token_counts, max_tokens, overlap_tokens))
+
+    print(f"Chunked {len(text_data)} paragraphs into {len(chunks)} chunks of at most {max_tokens} tokens")
+    return chunks
+
+
+def format_paragraphs(record):
+    """Citation for the paragraph range of a text record: "Paragraph 3" or "Paragraphs 3-5"."""
+    start = record["paragraph_number"]
+    end = record.get("paragraph_end", start)
+    return f"Paragraph {start}" if end == start else f"Paragraphs {start}-{end}"
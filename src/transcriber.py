@@ -1,32 +1,228 @@
 import os
-import torch
-import whisper
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from audio_preprocessor import AudioPreprocessor, to_source_time
+from transcription_cache import TranscriptionCache
+
+# Streaming transcription feeds Whisper speech windows of at most this many seconds
+WINDOW_SECONDS = 300
+
+# Source formats fetched without transcoding (the "best" fallback can be an .mp4), plus the MP3s of earlier downloads
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".mp4", ".webm", ".opus", ".ogg", ".wav")
+
+# Whisper model and preprocessor of a pool worker process, set up once by _init_worker
+_worker_model = None
+_worker_preprocessor = None
+
+def _compact_result(transcription):
+    """Keep only the text and the (start, end, text) of each segment of a Whisper result."""
+    return {
+        "text": transcription["text"],
+        "segments": [
+            {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+            for segment in transcription.get("segments", [])
+        ]
+    }
+
+def transcribe_speech(model, speech, decode_options, window_seconds=None):
+    """
+    Yield the compact Whisper result of each window of a SpeechAudio, with segment
+    times mapped back to the original recording.
+    """
+    for samples, timeline in speech.windows(window_seconds):
+        result = _compact_result(model.transcribe(samples, **decode_options))
+        for segment in result["segments"]:
+            segment["start"] = to_source_time(timeline, segment["start"])
+            segment["end"] = to_source_time(timeline, segment["end"])
+        yield result
+
+def _combine_results(results, speech):
+    """Join per-window results into one {"text", "segments", "skipped_seconds"} result."""
+    return {
+        "text": "".join(result["text"] for result in results),
+        "segments": [segment for result in results for segment in result["segments"]],
+        "skipped_seconds": round(float(speech.skipped_seconds), 2)
+    }
+
+def _init_worker(model_name, device, torch_threads, preprocessor):
+    """Pool initializer: cap torch threads to avoid oversubscription and load the model once."""
+    import torch
+    import whisper
+
+    global _worker_model, _worker_preprocessor
+    torch.set_num_threads(torch_threads)
+    _worker_model = whisper.load_model(model_name, device=device)
+    _worker_preprocessor = preprocessor
+
+def _transcribe_in_worker(audio_file, decode_options):
+    """Transcribe one file in a pool worker; returns (result, error)."""
+    try:
+        speech = _worker_preprocessor.prepare(audio_file)
+        return _combine_results(list(transcribe_speech(_worker_model, speech, decode_options)), speech), None
+    except Exception as e:
+        return None, str(e)
+
+# Helper: default Whisper device; torch and whisper are only imported where used, keeping this module cheap to import
+def default_device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+# Helper: reject missing or empty audio files before handing them to Whisper
+def is_valid_audio_file(audio_file):
+    if not os.path.exists(audio_file):
+        print(f"File not found: {audio_file}")
+        return False
+
+    if os.path.getsize(audio_file) == 0:
+        print(f"Empty file: {audio_file}")
+        return False
+    return True
 
 class AudioTranscriber:
-    def __init__(self, input_folder):
-        """Initialize the transcriber with the specified input folder."""
+    def __init__(self, input_folder, model_name="tiny", device=None, decode_options=None, use_cache=True, use_vad=True):
+        """
+        Initialize the transcriber with the specified input folder.
+        Results are cached by audio content hash, model name and decode_options unless use_cache is False.
+        Audio is decoded once into the PCM cache; with use_vad, silence and music beds are skipped.
+        """
         self.input_folder = os.path.abspath(input_folder)
-        self.whisper_model = None  # Model must be loaded externally
+        self.model_name = model_name
+        self.device = device or default_device()
+        self.decode_options = decode_options or {}
+        self.whisper_model = None  # Loaded externally, with load_model(), or on the first cache miss
+        self.transcription_cache = TranscriptionCache() if use_cache else None
+        self.preprocessor = AudioPreprocessor(use_vad=use_vad)
+        self.skipped_seconds = 0.0
         self.transcriptions_dict = {}
 
-    def transcribe_audio(self, audio_file):
-        """Transcribe a single audio file using the Whisper model."""
+    def load_model(self):
+        """Load the Whisper model for serial transcription."""
+        import whisper
+
+        self.whisper_model = whisper.load_model(self.model_name, device=self.device)
+        return self.whisper_model
+
+    def cache_options(self, **extra):
+        """Options that change the transcription: decode_options, VAD settings and any extra ones."""
+        options = {**self.decode_options, **extra}
+        vad_settings = self.preprocessor.settings()
+        if vad_settings:
+            options["vad"] = vad_settings
+        return options
+
+    def cache_key(self, audio_file):
+        return self.transcription_cache.key(audio_file, self.model_name, self.cache_options())
+
+    def cached_result(self, audio_file):
+        """Cached {"text", "segments"} result for audio_file, or None."""
+        if not self.transcription_cache:
+            return None
+        return self.transcription_cache.get(self.cache_key(audio_file))
+
+    def cache_result(self, audio_file, result):
+        if self.transcription_cache:
+            self.transcription_cache.set(self.cache_key(audio_file), result)
+
+    def transcribe_audio_result(self, audio_file):
+        """Transcribe a single audio file into {"text", "segments"}; the model is only loaded on a cache miss."""
         try:
-            if not os.path.exists(audio_file):
-                print(f"File not found: {audio_file}")
+            if not is_valid_audio_file(audio_file):
                 return None
 
-            if os.path.getsize(audio_file) == 0:
-                print(f"Empty file: {audio_file}")
-                return None
+            result = self.cached_result(audio_file)
+            if result is not None:
+                return result
 
-            transcription = self.whisper_model.transcribe(audio_file)
-            return transcription["text"]
+            if self.whisper_model is None:
+                self.load_model()
+            speech = self.preprocessor.prepare(audio_file)
+            result = _combine_results(list(transcribe_speech(self.whisper_model, speech, self.decode_options)), speech)
+            self.record_skipped(audio_file, result)
+            self.cache_result(audio_file, result)
+            return result
 
         except Exception as e:
             print(f"Error transcribing {audio_file}: {str(e)}")
             return None
 
+    def transcribe_audio(self, audio_file):
+        """Transcribe a single audio file using the Whisper model."""
+        result = self.transcribe_audio_result(audio_file)
+        return result["text"] if result else None
+
+    def stream_segments(self, url, audio_file, window_seconds=WINDOW_SECONDS):
+        """
+        Transcribe long audio window by window and yield segment records
+        {"url", "audio_path", "start", "end", "transcription"} as soon as each window is decoded.
+        Timestamps are in seconds from the start of the recording.
+        """
+        if not is_valid_audio_file(audio_file):
+            return
+
+        # A full transcription of the same file already holds every segment
+        cached = self.cached_result(audio_file)
+        if cached is not None:
+            for segment in cached["segments"]:
+                yield self.segment_record(url, audio_file, segment)
+            return
+
+        cache_key = None
+        if self.transcription_cache:
+            options = self.cache_options(window_seconds=window_seconds)
+            cache_key = self.transcription_cache.key(audio_file, self.model_name, options)
+            cached = self.transcription_cache.get(cache_key)
+            if cached is not None:
+                for segment in cached["segments"]:
+                    yield self.segment_record(url, audio_file, segment)
+                return
+
+        if self.whisper_model is None:
+            self.load_model()
+
+        speech = self.preprocessor.prepare(audio_file)
+        results = []
+        for window in transcribe_speech(self.whisper_model, speech, self.decode_options, window_seconds):
+            results.append(window)
+            for segment in window["segments"]:
+                yield self.segment_record(url, audio_file, segment)
+
+        result = _combine_results(results, speech)
+        self.record_skipped(audio_file, result)
+        if cache_key:
+            self.transcription_cache.set(cache_key, result)
+
+    def segment_record(self, url, audio_file, segment):
+        return {
+            "url": url,
+            "audio_path": audio_file,
+            "start": round(segment["start"], 2),
+            "end": round(segment["end"], 2),
+            "transcription": segment["text"].strip()
+        }
+
+    def transcribe_all_segments(self, audio_files_dict, window_seconds=WINDOW_SECONDS):
+        """Yield segment records for every downloaded audio file, file by file."""
+        for url, audio_path in self.audio_items(audio_files_dict):
+            try:
+                yield from self.stream_segments(url, audio_path, window_seconds)
+            except Exception as e:
+                print(f"Error transcribing {audio_path}: {str(e)}")
+
+    def record_skipped(self, audio_file, result):
+        """Count and print the seconds of audio the VAD kept away from Whisper."""
+        if self.preprocessor.use_vad:
+            self.skipped_seconds += result["skipped_seconds"]
+            print(f"Skipped {result['skipped_seconds']:.1f}s of silence/music in {os.path.basename(audio_file)}")
+
+    def report_cache(self):
+        """Print the transcription cache hit rate."""
+        if self.transcription_cache:
+            stats = self.transcription_cache.stats()
+            print(f"Transcription cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)")
+        if self.preprocessor.use_vad:
+            print(f"Voice activity detection skipped {self.skipped_seconds:.1f}s of audio in total")
+
     # def transcribe_all_audios(self, audio_files_dict):
     #     """Transcribe all downloaded audio files."""
     #     for url, audio_path in audio_files_dict.items():
@@ -47,17 +243,20 @@ class AudioTranscriber:
 
     #     return self.transcriptions_dict
 
-    def transcribe_all_audios(self, audio_files_dict):
-        """Transcribe all downloaded audio files and return structured data."""
-        audio_data = []  # Store formatted results
-
+    def audio_items(self, audio_files_dict):
+        """(url, audio_path) pairs of the audio files to transcribe."""
+        items = []
         for url, audio_path in audio_files_dict.items():
-            if not audio_path.endswith(".mp3"):
-                print(f"Skipping non-MP3 file: {audio_path}")
+            if not audio_path.lower().endswith(AUDIO_EXTENSIONS):
+                print(f"Skipping unsupported audio file: {audio_path}")
                 continue
+            items.append((url, audio_path))
+        return items
 
-            transcription = self.transcribe_audio(audio_path)
-
+    def format_results(self, items, transcriptions):
+        """Build the structured records, in input order, for the files that were transcribed."""
+        audio_data = []  # Store formatted results
+        for (url, audio_path), transcription in zip(items, transcriptions):
             if transcription:
                 audio_data.append({
                     "url": url,
@@ -66,5 +265,83 @@ class AudioTranscriber:
                 })
             else:
                 print(f"Failed to transcribe: {audio_path}")
-
         return audio_data
+
+    def format_segments(self, items, results):
+        """Segment records of the transcribed files, taken from the same results as the full transcripts."""
+        return [
+            self.segment_record(url, audio_path, segment)
+            for (url, audio_path), result in zip(items, results) if result
+            for segment in result["segments"]
+        ]
+
+    def transcribe_all_audios(self, audio_files_dict, with_segments=False):
+        """
+        Transcribe all downloaded audio files and return structured data.
+        With with_segments, returns (audio_data, segment records) from the same single pass.
+        """
+        items = self.audio_items(audio_files_dict)
+        results = [self.transcribe_audio_result(audio_path) for _, audio_path in items]
+        self.report_cache()
+        audio_data = self.format_results(items, [result["text"] if result else None for result in results])
+        return (audio_data, self.format_segments(items, results)) if with_segments else audio_data
+
+    def run_pool(self, indexed_paths, workers, torch_threads):
+        """
+        Transcribe (index, audio_path) pairs in one process pool. Returns ({index: (result, error)},
+        indices left unfinished because a worker died and broke the pool).
+        """
+        finished = {}
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.model_name, self.device, torch_threads, self.preprocessor)
+        ) as executor:
+            futures = {i: executor.submit(_transcribe_in_worker, path, self.decode_options) for i, path in indexed_paths}
+            for i, future in futures.items():
+                try:
+                    finished[i] = future.result()
+                except BrokenProcessPool:
+                    continue
+                except Exception as e:
+                    finished[i] = (None, str(e))
+        return finished, [i for i in futures if i not in finished]
+
+    def transcribe_all_audios_parallel(self, audio_files_dict, workers=2, torch_threads=None, with_segments=False):
+        """
+        Transcribe audio files in a process pool where each worker loads the Whisper model once.
+        With with_segments, returns (audio_data, segment records) like transcribe_all_audios.
+
+        torch_threads defaults to an even share of the CPU cores per worker. Results keep the
+        input order, and a file that fails only loses that file. A dying worker breaks the whole
+        pool, so the unfinished files are retried one at a time in a fresh pool, where the file
+        that takes the worker down is dropped and the rest carry on.
+        """
+        torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // workers)
+        items = [(url, path) for url, path in self.audio_items(audio_files_dict) if is_valid_audio_file(path)]
+
+        # Cache hits are resolved here; only misses reach the pool
+        results = [self.cached_result(audio_path) for _, audio_path in items]
+        pending = [i for i, result in enumerate(results) if result is None]
+        workers = min(workers, len(pending)) or 1
+
+        while pending:
+            finished, pending = self.run_pool([(i, items[i][1]) for i in pending], workers, torch_threads)
+            for i, (result, error) in finished.items():
+                audio_path = items[i][1]
+                if error:
+                    print(f"Error transcribing {audio_path}: {error}")
+                elif result:
+                    self.record_skipped(audio_path, result)
+                    self.cache_result(audio_path, result)
+                results[i] = result
+            if pending and workers == 1:
+                # One worker runs the files in submission order, so the first unfinished one killed it
+                print(f"Error transcribing {items[pending.pop(0)][1]}: worker process died")
+            elif pending:
+                print(f"A worker process died; retrying {len(pending)} unfinished files one at a time")
+                workers = 1
+
+        self.report_cache()
+        audio_data = self.format_results(items, [result["text"] if result else None for result in results])
+        return (audio_data, self.format_segments(items, results)) if with_segments else audio_data
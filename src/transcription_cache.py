@@ -0,0 +1,29 @@
+import hashlib
+import json
+from disk_cache import DiskLRUCache, file_sha256
+
+TRANSCRIPTION_CACHE_PATH = "./transcription_cache/transcriptions.sqlite3"
+TRANSCRIPTION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class TranscriptionCache:
+    """Persistent Whisper results keyed by audio content hash, model name and decode options."""
+
+    def __init__(self, path=TRANSCRIPTION_CACHE_PATH, max_bytes=TRANSCRIPTION_CACHE_MAX_BYTES):
+        self.store = DiskLRUCache(path, max_bytes)
+
+    def key(self, audio_file, model_name, decode_options):
+        options_hash = hashlib.sha256(json.dumps(decode_options, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{file_sha256(audio_file)}:{model_name}:{options_hash[:16]}"
+
+    def get(self, key):
+        """Return the cached {"text", "segments"} result, or None."""
+        value = self.store.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, result):
+        """Store a {"text", "segments"} result."""
+        self.store.set(key, json.dumps(result).encode("utf-8"))
+
+    def stats(self):
+        return self.store.stats()
@@ -1,27 +1,69 @@
-import chromadb
 import uuid
+import hashlib
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-import os
+from embeddings import get_embedding, get_embeddings, embedding_model_id
+from query_cache import TTLCache, search_key
+from record_store import iter_batches
+from lexical_index import LexicalIndex, lexical_document, reciprocal_rank_fusion
+import resources
 from dotenv import load_dotenv
 
 # Load environment variables from .env
 load_dotenv()
 
-# Load embedding model
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# ChromaDB Persistent Storage, opened on first use
+def _open_chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path="./chroma_storage")
 
-# Initialize ChromaDB Persistent Storage
-client = chromadb.PersistentClient(path="./chroma_storage")
-collection = client.get_or_create_collection("esg_vectors")
+resources.register("chroma_client", _open_chroma_client)
+resources.register("chroma_collection", lambda: get_client().get_or_create_collection("esg_vectors"))
+
+def get_client():
+    return resources.get("chroma_client")
+
+def get_collection():
+    return resources.get("chroma_collection")
+
+# BM25 index over the same record IDs, updated by the ingest functions
+LEXICAL_INDEX_PATH = "./lexical_index/esg_vectors.npz"
+resources.register("lexical_index", lambda: LexicalIndex(LEXICAL_INDEX_PATH))
+
+def get_lexical_index():
+    return resources.get("lexical_index")
+
+# Hybrid search ranks this many candidates per limit slot on each side before fusing
+HYBRID_CANDIDATES_PER_RESULT = 3
 
 # Helper: UUID generator
 def generate_uuid5(seed: str) -> str:
     return str(uuid.uuid5(uuid.NAMESPACE_DNS, seed))
 
-# Generate embedding
-def get_embedding(text):
-    return embedding_model.encode(text).tolist()
+# Number of records encoded and written per bulk ingestion step
+INGEST_BATCH_SIZE = 64
+
+# Query-side caches; search results are dropped whenever an ingest function writes
+query_embedding_cache = TTLCache(max_entries=1024, ttl_seconds=3600)
+search_cache = TTLCache(max_entries=256, ttl_seconds=600)
+
+def invalidate_search_cache():
+    """Drop cached search results after the collection changed."""
+    search_cache.clear()
+
+def collection_fingerprint():
+    """Identify the current collection contents; changes on every write, delete or reset."""
+    current = get_client().get_collection("esg_vectors")
+    return f"{current.id}:{(current.metadata or {}).get('revision', 0)}"
+
+def mark_collection_changed():
+    """Record a new collection revision and drop results cached against the old one."""
+    collection = get_collection()
+    collection.modify(metadata={**(collection.metadata or {}), "revision": uuid.uuid4().hex})
+    invalidate_search_cache()
+
+def search_cache_stats():
+    """Hit/miss counters of the query embedding and search result caches."""
+    return {"query_embeddings": query_embedding_cache.stats(), "search_results": search_cache.stats()}
 
 # Data ingestion functions
 # def ingest_audio_data(audio_data):
@@ -36,27 +78,8 @@ def get_embedding(text):
 #         )
 
 def ingest_audio_data(audio_data):
-    """Store ESG audio data in ChromaDB without duplicates."""
-    for audio in tqdm(audio_data, desc="Ingesting audio data"):
-        audio_id = generate_uuid5(audio['url'])
-
-        # Check if this ID already exists
-        existing_results = collection.query(
-            query_texts=[audio['transcription']],
-            n_results=1
-        )
-
-        if existing_results["ids"]:
-            print(f"Skipping duplicate audio: {audio['url']}")
-            continue  # Don't add duplicate
-
-        vector = get_embedding(audio['transcription'])
-        collection.add(
-            documents=[audio['transcription']],
-            metadatas=[audio],
-            ids=[audio_id],
-            embeddings=[vector]
-        )
+    """Store ESG audio data in ChromaDB, re-embedding only new or changed transcripts."""
+    bulk_ingest_audio_data(audio_data, batch_size=1)
 
 # def ingest_text_data(text_data):
 #     """Store ESG report text in ChromaDB."""
@@ -70,28 +93,8 @@ def ingest_audio_data(audio_data):
 #         )
 
 def ingest_text_data(text_data):
-    """Store ESG report text in ChromaDB without duplicates."""
-    for text in tqdm(text_data, desc="Ingesting text data"):
-        text_id = generate_uuid5(f"{text['source_document']}_{text['page_number']}_{text['paragraph_number']}")
-
-        # Check if this ID already exists
-        existing_results = collection.query(
-            query_texts=[text["text"]],
-            n_results=1
-        )
-
-        if existing_results["ids"]:
-            print(f"Skipping duplicate text: {text['source_document']} Page {text['page_number']}")
-            continue  # Don't add duplicate
-
-        vector = get_embedding(text["text"])
-        collection.add(
-            documents=[text["text"]],
-            metadatas=[text],
-            ids=[text_id],
-            embeddings=[vector]
-        )
-
+    """Store ESG report text in ChromaDB, re-embedding only new or changed paragraphs."""
+    bulk_ingest_text_data(text_data, batch_size=1)
 
 # def ingest_image_data(image_data):
 #     """Store ESG images in ChromaDB without requiring a description."""
@@ -106,28 +109,8 @@ def ingest_text_data(text_data):
 #         )
 
 def ingest_image_data(image_data):
-    """Store ESG images in ChromaDB while preventing duplicates."""
-    for image in tqdm(image_data, desc="Ingesting image data"):
-        image_id = generate_uuid5(f"{image['source_document']}_{image['page_number']}_{image['image_path']}")
-
-        # Check if this ID already exists
-        existing_results = collection.query(
-            query_texts=[image["image_path"]],
-            n_results=1
-        )
-
-        if existing_results["ids"]:
-            print(f"Skipping duplicate image: {image['image_path']}")
-            continue  # Don't add duplicate
-
-        vector = get_embedding(image["image_path"])
-        collection.add(
-            documents=[image["image_path"]],
-            metadatas=[image],
-            ids=[image_id],
-            embeddings=[vector]
-        )
-
+    """Store ESG images in ChromaDB, re-embedding only new or changed images."""
+    bulk_ingest_image_data(image_data, batch_size=1)
 
 # def ingest_table_data(table_data):
 #     """Store ESG tables in ChromaDB using `table_content` instead of `description`."""
@@ -142,42 +125,316 @@ def ingest_image_data(image_data):
 #         )
 
 def ingest_table_data(table_data):
-    """Store ESG tables in ChromaDB while preventing duplicates."""
-    for table in tqdm(table_data, desc="Ingesting table data"):
-        table_id = generate_uuid5(f"{table['source_document']}_{table['page_number']}")
-
-        # Check if this ID already exists
-        existing_results = collection.query(
-            query_texts=[table["table_content"]],
-            n_results=1
+    """Store ESG tables in ChromaDB, re-embedding only new or changed tables."""
+    bulk_ingest_table_data(table_data, batch_size=1)
+
+# Helper: content hash stored in metadata to detect changed records (or vectors from another backend)
+def content_hash(text: str) -> str:
+    return hashlib.sha256(f"{embedding_model_id()}\n{text}".encode("utf-8")).hexdigest()
+
+def get_stored_hashes(ids):
+    """Look up the stored content hash for each ID that already exists in the collection."""
+    existing = get_collection().get(ids=ids, include=["metadatas"])
+    return {
+        record_id: (metadata or {}).get("content_hash")
+        for record_id, metadata in zip(existing["ids"], existing["metadatas"])
+    }
+
+def delete_vanished_records(content_type, scope_field, seen_ids):
+    """Delete records of a re-processed scope (e.g. a source document) that were not seen this run."""
+    deleted = []
+    for scope_value, ids in seen_ids.items():
+        stored = get_collection().get(
+            where={"$and": [{"content_type": content_type}, {scope_field: scope_value}]},
+            include=[]
         )
-
-        if existing_results["ids"]:
-            print(f"Skipping duplicate table from Page {table['page_number']}")
-            continue  # Don't add duplicate
-
-        vector = get_embedding(table["table_content"])
-        collection.add(
-            documents=[table["table_content"]],
-            metadatas=[table],
-            ids=[table_id],
-            embeddings=[vector]
+        vanished = [record_id for record_id in stored["ids"] if record_id not in ids]
+        if vanished:
+            get_collection().delete(ids=vanished)
+            deleted.extend(vanished)
+    return deleted
+
+# Record IDs and embedded documents per content type, shared with the other vector store backends
+def audio_id(audio):
+    return generate_uuid5(audio['url'])
+
+def audio_segment_id(segment):
+    return generate_uuid5(f"{segment['url']}_{segment['start']:.2f}")
+
+def text_id(text):
+    return generate_uuid5(f"{text['source_document']}_{text['page_number']}_{text['paragraph_number']}")
+
+def image_id(image):
+    return generate_uuid5(f"{image['source_document']}_{image['page_number']}_{image['image_path']}")
+
+def transcription_document(record):
+    return record['transcription']
+
+def text_document(text):
+    return text['text']
+
+def image_document(image):
+    return image['image_path']
+
+def table_document(table):
+    return table['table_content']
+
+# Helper: several tables can share a page, so number them to keep their IDs distinct
+def number_tables(table_data):
+    counters = {}
+    for table in table_data:
+        key = (table['source_document'], table['page_number'])
+        counters[key] = counters.get(key, 0) + 1
+        yield {**table, "table_number": table.get("table_number", counters[key])}
+
+def table_id(table):
+    """First table on a page keeps the original page-based ID."""
+    seed = f"{table['source_document']}_{table['page_number']}"
+    if table.get("table_number", 1) > 1:
+        seed += f"_{table['table_number']}"
+    return generate_uuid5(seed)
+
+# content_type -> (id_fn, document_fn); tables go through number_tables() first
+RECORD_KINDS = {
+    "audio": (audio_id, transcription_document),
+    "audio_segment": (audio_segment_id, transcription_document),
+    "text": (text_id, text_document),
+    "image": (image_id, image_document),
+    "table": (table_id, table_document),
+}
+
+# content_type -> field scoping a re-ingest: records of a scope that are not seen again are deleted,
+# other scopes are left alone; audio records are only ever upserted
+SCOPE_FIELDS = {
+    "audio_segment": "url",
+    "text": "source_document",
+    "image": "source_document",
+    "table": "source_document",
+}
+
+# Bulk ingestion functions
+def bulk_ingest(records, content_type, id_fn, document_fn, scope_field=None, batch_size=INGEST_BATCH_SIZE,
+                embeddings=None):
+    """
+    Incrementally ingest records in batches.
+
+    records can be any iterable, e.g. a JSONL reader, so only one batch is held in memory.
+    Existing IDs are checked with one collection.get per batch; only new records or
+    records whose content hash changed are upserted, using the row-aligned embeddings
+    matrix when given and encoding them otherwise. When scope_field is given, records
+    of the same scope that are no longer present are deleted. The lexical index is kept
+    in step, re-tokenizing only the records whose text changed.
+    """
+    lexical_index = get_lexical_index()
+    seen_ids = {}
+    written = unchanged = 0
+    row = 0
+
+    for batch in tqdm(iter_batches(records, batch_size), desc=f"Ingesting {content_type} data"):
+        first_row = row
+        row += len(batch)
+        ids = [id_fn(record) for record in batch]
+        documents = [document_fn(record) for record in batch]
+        hashes = [content_hash(document) for document in documents]
+        lexical_index.update(ids, [lexical_document(record) for record in batch])
+
+        if scope_field:
+            for record, record_id in zip(batch, ids):
+                seen_ids.setdefault(record[scope_field], set()).add(record_id)
+
+        stored_hashes = get_stored_hashes(ids)
+        changed = [i for i in range(len(batch)) if stored_hashes.get(ids[i]) != hashes[i]]
+        unchanged += len(batch) - len(changed)
+        if not changed:
+            continue
+
+        changed_documents = [documents[i] for i in changed]
+        if embeddings is not None:
+            vectors = [embeddings[first_row + i].tolist() for i in changed]
+        else:
+            vectors = get_embeddings(changed_documents, batch_size)
+        get_collection().upsert(
+            documents=changed_documents,
+            metadatas=[{**batch[i], "content_type": content_type, "content_hash": hashes[i]} for i in changed],
+            ids=[ids[i] for i in changed],
+            embeddings=vectors
         )
-
-
+        written += len(changed)
+
+    deleted = delete_vanished_records(content_type, scope_field, seen_ids) if scope_field else []
+    lexical_index.remove(deleted)
+    lexical_changed = lexical_index.commit()
+    if lexical_changed:
+        lexical_index.save()
+    if written or deleted or lexical_changed:
+        mark_collection_changed()
+    print(f"{content_type}: {written} written, {unchanged} unchanged, {len(deleted)} deleted")
+    return {"written": written, "unchanged": unchanged, "deleted": len(deleted)}
+
+def bulk_ingest_audio_data(audio_data, batch_size=INGEST_BATCH_SIZE, embeddings=None):
+    """Store ESG audio data in ChromaDB in batches."""
+    bulk_ingest(
+        audio_data, "audio",
+        id_fn=audio_id,
+        document_fn=transcription_document,
+        batch_size=batch_size,
+        embeddings=embeddings
+    )
+
+def bulk_ingest_audio_segment_data(segment_data, batch_size=INGEST_BATCH_SIZE, embeddings=None):
+    """Store timestamped audio transcription segments in ChromaDB, one vector per segment."""
+    bulk_ingest(
+        segment_data, "audio_segment",
+        id_fn=audio_segment_id,
+        document_fn=transcription_document,
+        scope_field=SCOPE_FIELDS["audio_segment"],
+        batch_size=batch_size,
+        embeddings=embeddings
+    )
+
+def bulk_ingest_text_data(text_data, batch_size=INGEST_BATCH_SIZE, embeddings=None):
+    """Store ESG report text in ChromaDB in batches."""
+    bulk_ingest(
+        text_data, "text",
+        id_fn=text_id,
+        document_fn=text_document,
+        scope_field=SCOPE_FIELDS["text"],
+        batch_size=batch_size,
+        embeddings=embeddings
+    )
+
+def bulk_ingest_image_data(image_data, batch_size=INGEST_BATCH_SIZE, embeddings=None):
+    """Store ESG images in ChromaDB in batches."""
+    bulk_ingest(
+        image_data, "image",
+        id_fn=image_id,
+        document_fn=image_document,
+        scope_field=SCOPE_FIELDS["image"],
+        batch_size=batch_size,
+        embeddings=embeddings
+    )
+
+def bulk_ingest_table_data(table_data, batch_size=INGEST_BATCH_SIZE, embeddings=None):
+    """Store ESG tables in ChromaDB in batches."""
+    bulk_ingest(
+        number_tables(table_data), "table",
+        id_fn=table_id,
+        document_fn=table_document,
+        scope_field=SCOPE_FIELDS["table"],
+        batch_size=batch_size,
+        embeddings=embeddings
+    )
 
 # Unified ingestion function
-def ingest_all_data(audio_data, text_data, image_data, table_data):
-    """Store all multimodal ESG data in ChromaDB."""
-    ingest_audio_data(audio_data)
-    ingest_text_data(text_data)
-    ingest_image_data(image_data)
-    ingest_table_data(table_data)
+def ingest_all_data(audio_data, text_data, image_data, table_data, batched=True, batch_size=INGEST_BATCH_SIZE,
+                    audio_segment_data=None, text_embeddings=None):
+    """
+    Store all multimodal ESG data in ChromaDB, using the bulk path unless batched=False.
+    Each *_data can be a list or a generator; text_embeddings is an optional row-aligned matrix for text_data.
+    """
+    if audio_segment_data is not None:
+        bulk_ingest_audio_segment_data(audio_segment_data, batch_size)
+
+    if not batched:
+        ingest_audio_data(audio_data)
+        ingest_text_data(text_data)
+        ingest_image_data(image_data)
+        ingest_table_data(table_data)
+        return
+
+    bulk_ingest_audio_data(audio_data, batch_size)
+    bulk_ingest_text_data(text_data, batch_size, text_embeddings)
+    bulk_ingest_image_data(image_data, batch_size)
+    bulk_ingest_table_data(table_data, batch_size)
+
+# Query embedding, cached per query string
+def get_query_embedding(query: str):
+    query_vector = query_embedding_cache.get(query)
+    if query_vector is None:
+        query_vector = get_embedding(query)
+        query_embedding_cache.set(query, query_vector)
+    return query_vector
+
+# Helper: metadata filters as a Chroma where clause (also understood by the numpy index)
+def build_where(content_type=None, source_document=None, page_range=None):
+    """
+    content_type and source_document take a value or a list of values; page_range is an
+    inclusive (first, last) pair where either end may be None. Returns None without filters.
+    """
+    clauses = []
+    for field, value in (("content_type", content_type), ("source_document", source_document)):
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({field: {"$in": list(value)}})
+        elif value is not None:
+            clauses.append({field: value})
+    if page_range:
+        first, last = page_range
+        if first is not None:
+            clauses.append({"page_number": {"$gte": first}})
+        if last is not None:
+            clauses.append({"page_number": {"$lte": last}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
 # Multimodal search function
-def search_multimodal(query: str, limit: int = 10):
-    """Perform vector search in ChromaDB to retrieve relevant ESG data."""
-    query_vector = get_embedding(query)
-    results = collection.query(query_embeddings=[query_vector], n_results=limit)
+def search_multimodal(query: str, limit: int = 10, where=None, content_type=None, source_document=None,
+                      page_range=None, hybrid=False):
+    """
+    Perform vector search in ChromaDB to retrieve relevant ESG data, serving repeats from cache.
+    content_type, source_document and page_range are pushed down into the query as a where clause.
+    With hybrid=True, the vector ranking is fused with a BM25 ranking (see hybrid_search).
+    """
+    filters = build_where(content_type, source_document, page_range)
+    if filters and where:
+        where = {"$and": [where, filters]}
+    else:
+        where = where or filters
+
+    key = search_key(query, limit, {"where": where, "hybrid": True} if hybrid else where)
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+
+    query_vector = get_query_embedding(query)
+    if hybrid:
+        results = hybrid_search(query, query_vector, limit, where)
+    else:
+        results = get_collection().query(query_embeddings=[query_vector], n_results=limit, where=where)
+    search_cache.set(key, results)
 
     return results
+
+def hybrid_search(query, query_vector, limit, where=None):
+    """
+    Fuse the vector and BM25 rankings of the top limit * HYBRID_CANDIDATES_PER_RESULT candidates
+    with reciprocal rank fusion. Returns a Chroma query result; records found only lexically have
+    distance None, and "fusion_scores" holds the RRF scores.
+    """
+    candidates = limit * HYBRID_CANDIDATES_PER_RESULT
+    vector = get_collection().query(query_embeddings=[query_vector], n_results=candidates, where=where)
+    records = {
+        record_id: (distance, metadata, document)
+        for record_id, distance, metadata, document in zip(
+            vector["ids"][0], vector["distances"][0], vector["metadatas"][0], vector["documents"][0]
+        )
+    }
+
+    # Lexical matches the vector side did not return are fetched through the same where clause
+    lexical_ids = [record_id for record_id, _ in get_lexical_index().search(query, candidates)]
+    missing = [record_id for record_id in lexical_ids if record_id not in records]
+    if missing:
+        fetched = get_collection().get(ids=missing, where=where, include=["metadatas", "documents"])
+        for record_id, metadata, document in zip(fetched["ids"], fetched["metadatas"], fetched["documents"]):
+            records[record_id] = (None, metadata, document)
+    lexical_ids = [record_id for record_id in lexical_ids if record_id in records]
+
+    fused = reciprocal_rank_fusion([vector["ids"][0], lexical_ids])[:limit]
+    return {
+        "ids": [[record_id for record_id, _ in fused]],
+        "distances": [[records[record_id][0] for record_id, _ in fused]],
+        "metadatas": [[records[record_id][1] for record_id, _ in fused]],
+        "documents": [[records[record_id][2] for record_id, _ in fused]],
+        "fusion_scores": [[score for _, score in fused]],
+    }
@@ -0,0 +1,215 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import resources
+from query_cache import TTLCache, search_key
+
+# Vector store used by esg_analysis: "chroma" (default), "weaviate" or "numpy" (in-process mmap index).
+# Overridden by the VECTOR_STORE_BACKEND environment variable (or .env).
+DEFAULT_VECTOR_STORE_BACKEND = "chroma"
+WEAVIATE_COLLECTION = "RAGESGDocuments"
+
+# Hits per modality in quota mode, so short text fragments cannot crowd out tables
+DEFAULT_MODALITY_QUOTAS = {"text": 4, "table": 3, "image": 1, "audio_segment": 2}
+
+
+class VectorStore(ABC):
+    """
+    Common interface of the vector store backends.
+
+    search() returns hits as {"id", "distance", "metadata"} dicts, nearest first, whatever the
+    backend; metadata holds content_type and the fields of the ingested record. The filters
+    (content_type, source_document, page_range) are pushed down into the store's query, and
+    hybrid=True fuses the vector ranking with a BM25 ranking (distance is None for hits found
+    only lexically).
+    """
+
+    name = None
+
+    @abstractmethod
+    def ingest_all_data(self, audio_data, text_data, image_data, table_data, audio_segment_data=None, **options):
+        pass
+
+    @abstractmethod
+    def search(self, query, limit=10, where=None, content_type=None, source_document=None, page_range=None,
+               hybrid=False):
+        pass
+
+    def search_by_modality(self, query, quotas=None, source_document=None, page_range=None, hybrid=False):
+        """
+        Query each modality concurrently for its quota of hits and merge them by distance.
+        Returns {"hits": [...], "timings": {content_type: seconds}}.
+        """
+        quotas = quotas or DEFAULT_MODALITY_QUOTAS
+        self.query_embedding(query)  # Embed once before fanning out; the workers hit the cache
+
+        def search_modality(content_type):
+            start = time.perf_counter()
+            hits = self.search(query, quotas[content_type], content_type=content_type,
+                               source_document=source_document, page_range=page_range, hybrid=hybrid)
+            return hits, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=len(quotas)) as executor:
+            results = dict(zip(quotas, executor.map(search_modality, quotas)))
+
+        hits = [hit for modality_hits, _ in results.values() for hit in modality_hits]
+        hits.sort(key=lambda hit: float("inf") if hit["distance"] is None else hit["distance"])
+        return {"hits": hits, "timings": {content_type: seconds for content_type, (_, seconds) in results.items()}}
+
+    @abstractmethod
+    def query_embedding(self, query):
+        pass
+
+    @abstractmethod
+    def fingerprint(self):
+        """Identifies the stored contents; changes whenever they do (used to expire cached answers)."""
+
+    @abstractmethod
+    def cache_stats(self):
+        pass
+
+
+class ChromaStore(VectorStore):
+    name = "chroma"
+
+    def ingest_all_data(self, audio_data, text_data, image_data, table_data, audio_segment_data=None, **options):
+        import vector_storage
+        vector_storage.ingest_all_data(audio_data, text_data, image_data, table_data,
+                                       audio_segment_data=audio_segment_data, **options)
+
+    def search(self, query, limit=10, where=None, content_type=None, source_document=None, page_range=None,
+               hybrid=False):
+        import vector_storage
+        results = vector_storage.search_multimodal(query, limit=limit, where=where, content_type=content_type,
+                                                   source_document=source_document, page_range=page_range,
+                                                   hybrid=hybrid)
+        if not results or not results.get("metadatas"):
+            return []
+        distances = results["distances"][0] if results.get("distances") else [None] * len(results["ids"][0])
+        return [
+            {"id": record_id, "distance": distance, "metadata": metadata}
+            for record_id, distance, metadata in zip(results["ids"][0], distances, results["metadatas"][0])
+        ]
+
+    def query_embedding(self, query):
+        import vector_storage
+        return vector_storage.get_query_embedding(query)
+
+    def fingerprint(self):
+        import vector_storage
+        return f"chroma:{vector_storage.collection_fingerprint()}"
+
+    def cache_stats(self):
+        import vector_storage
+        return vector_storage.search_cache_stats()
+
+
+class WeaviateStore(VectorStore):
+    name = "weaviate"
+
+    def ingest_all_data(self, audio_data, text_data, image_data, table_data, audio_segment_data=None, **options):
+        import weaviate_vector_storage
+        weaviate_vector_storage.ingest_all_data(
+            WEAVIATE_COLLECTION, audio_data, text_data, image_data, table_data, audio_segment_data
+        )
+
+    def search(self, query, limit=10, where=None, content_type=None, source_document=None, page_range=None,
+               hybrid=False):
+        import weaviate_vector_storage
+        objects = weaviate_vector_storage.search_multimodal(query, limit=limit, filters=where, content_type=content_type,
+                                                            source_document=source_document, page_range=page_range,
+                                                            hybrid=hybrid)
+        return [
+            {
+                "id": str(obj.uuid),
+                "distance": obj.metadata.distance,
+                "metadata": {key: value for key, value in obj.properties.items() if value is not None},
+            }
+            for obj in objects
+        ]
+
+    def query_embedding(self, query):
+        import weaviate_vector_storage
+        return weaviate_vector_storage.get_query_embedding(query)
+
+    def fingerprint(self):
+        import weaviate_vector_storage
+        return f"weaviate:{weaviate_vector_storage.collection_fingerprint(WEAVIATE_COLLECTION)}"
+
+    def cache_stats(self):
+        import weaviate_vector_storage
+        return weaviate_vector_storage.search_cache_stats()
+
+
+class NumpyStore(VectorStore):
+    """In-process backend over the memory-mapped NumpyVectorIndex; needs no server."""
+
+    name = "numpy"
+
+    def __init__(self):
+        from numpy_vector_store import NumpyVectorIndex
+        self.index = NumpyVectorIndex()
+        self.query_embedding_cache = TTLCache(max_entries=1024, ttl_seconds=3600)
+        self.search_cache = TTLCache(max_entries=256, ttl_seconds=600)
+
+    def ingest_all_data(self, audio_data, text_data, image_data, table_data, audio_segment_data=None,
+                        batch_size=None, text_embeddings=None, **options):
+        # Like the Chroma path, only the documents and videos present in the new records are replaced
+        records_by_type = {"audio": audio_data, "text": text_data, "image": image_data, "table": table_data}
+        if audio_segment_data is not None:
+            records_by_type["audio_segment"] = audio_segment_data
+        extra = {"batch_size": batch_size} if batch_size else {}
+        self.index.ingest(records_by_type, embeddings_by_type={"text": text_embeddings}, **extra)
+        self.search_cache.clear()
+
+    def search(self, query, limit=10, where=None, content_type=None, source_document=None, page_range=None,
+               hybrid=False):
+        from vector_storage import build_where
+        filters = build_where(content_type, source_document, page_range)
+        where = {"$and": [where, filters]} if where and filters else where or filters
+
+        # The index version is part of the key, so results never outlive an ingest
+        key = search_key(query, limit, {"where": where, "hybrid": hybrid, "version": self.index.current_version()})
+        hits = self.search_cache.get(key)
+        if hits is None:
+            index = self.index.open()
+            if index is None:
+                hits = []
+            elif hybrid:
+                hits = index.hybrid_search(query, self.query_embedding(query), limit, where)
+            else:
+                hits = index.search(self.query_embedding(query), limit, where)
+            self.search_cache.set(key, hits)
+        return hits
+
+    def query_embedding(self, query):
+        from embeddings import get_embedding
+        query_vector = self.query_embedding_cache.get(query)
+        if query_vector is None:
+            query_vector = get_embedding(query)
+            self.query_embedding_cache.set(query, query_vector)
+        return query_vector
+
+    def fingerprint(self):
+        return f"numpy:{self.index.current_version()}"
+
+    def cache_stats(self):
+        return {"query_embeddings": self.query_embedding_cache.stats(), "search_results": self.search_cache.stats()}
+
+
+VECTOR_STORES = {"chroma": ChromaStore, "weaviate": WeaviateStore, "numpy": NumpyStore}
+
+
+def vector_store_backend():
+    backend = os.getenv("VECTOR_STORE_BACKEND", DEFAULT_VECTOR_STORE_BACKEND)
+    if backend not in VECTOR_STORES:
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}', use one of {', '.join(VECTOR_STORES)}")
+    return backend
+
+
+resources.register("vector_store", lambda: VECTOR_STORES[vector_store_backend()]())
+
+
+def get_vector_store():
+    return resources.get("vector_store")
@@ -1,131 +1,230 @@
-import weaviate
-from weaviate.classes import Property, DataType
-import weaviate.classes.query as wq
 from tqdm import tqdm
 import uuid
-from sentence_transformers import SentenceTransformer
+from embeddings import get_embedding, get_embeddings
+from record_store import iter_batches
+from vector_storage import INGEST_BATCH_SIZE, RECORD_KINDS, number_tables
+from query_cache import TTLCache, search_key
+import resources
 import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env
 load_dotenv()
 
-# Load embedding model
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# Query-side caches; search results are dropped whenever an ingest function writes
+query_embedding_cache = TTLCache(max_entries=1024, ttl_seconds=3600)
+search_cache = TTLCache(max_entries=256, ttl_seconds=600)
 
-# Helper: UUID generator
-def generate_uuid5(seed: str) -> str:
-    return str(uuid.uuid5(uuid.NAMESPACE_DNS, seed))
+def invalidate_search_cache():
+    """Drop cached search results after the collection changed."""
+    search_cache.clear()
+
+# Helper: revision marker kept in the collection description, replaced on every write, so it is
+# shared by all processes and survives restarts (the Chroma path keeps it in the collection metadata)
+def new_revision():
+    return f"revision:{uuid.uuid4().hex}"
+
+def mark_collection_changed(collection):
+    """Record a new collection revision and drop results cached against the old one."""
+    collection.config.update(description=new_revision())
+    invalidate_search_cache()
+
+def collection_fingerprint(collection_name="RAGESGDocuments"):
+    """Identify the current collection contents; changes on every write or re-creation."""
+    collection = get_client().collections.get(collection_name)
+    return f"{collection_name}:{collection.config.get().description or ''}"
+
+def search_cache_stats():
+    """Hit/miss counters of the query embedding and search result caches."""
+    return {"query_embeddings": query_embedding_cache.stats(), "search_results": search_cache.stats()}
 
 # Connect to Weaviate Cloud Service
 WCS_URL = os.getenv("WCS_URL")  # Ensure these are set in your environment
 WCS_API_KEY = os.getenv("WCS_API_KEY")
 
-client = weaviate.connect_to_weaviate_cloud(
-    cluster_url=WCS_URL,
-    auth_credentials=weaviate.auth.AuthApiKey(WCS_API_KEY),
-)
-
-# Define metadata schema
-properties = [
-    Property(name="source_document", data_type=DataType.TEXT, skip_vectorization=True),
-    Property(name="page_number", data_type=DataType.INT, skip_vectorization=True),
-    Property(name="paragraph_number", data_type=DataType.INT, skip_vectorization=True),
-    Property(name="text", data_type=DataType.TEXT),
-    Property(name="image_path", data_type=DataType.TEXT, skip_vectorization=True),
-    Property(name="description", data_type=DataType.TEXT),
-    Property(name="base64_encoding", data_type=DataType.BLOB, skip_vectorization=True),
-    Property(name="table_content", data_type=DataType.TEXT),
-    Property(name="url", data_type=DataType.TEXT, skip_vectorization=True),
-    Property(name="audio_path", data_type=DataType.TEXT, skip_vectorization=True),
-    Property(name="transcription", data_type=DataType.TEXT),
-    Property(name="content_type", data_type=DataType.TEXT, skip_vectorization=True),
-]
-
-# Create collection if not exists
-def initialize_collection():
-    if "RAGESGDocuments" in client.collections.list_all():
-        client.collections.delete("RAGESGDocuments")
+def _connect_weaviate():
+    import weaviate
+    return weaviate.connect_to_weaviate_cloud(
+        cluster_url=WCS_URL,
+        auth_credentials=weaviate.auth.AuthApiKey(WCS_API_KEY),
+    )
+
+# The connection is only opened on first use
+resources.register("weaviate_client", _connect_weaviate)
+
+def get_client():
+    return resources.get("weaviate_client")
+
+# Define metadata schema; filter-only fields use whole-value tokenization so equal() matches
+# the exact value ("audio" must not match "audio_segment")
+def get_properties():
+    from weaviate.classes.config import DataType, Property, Tokenization
+    return [
+        Property(name="source_document", data_type=DataType.TEXT, skip_vectorization=True,
+                 tokenization=Tokenization.FIELD),
+        Property(name="page_number", data_type=DataType.INT, skip_vectorization=True),
+        Property(name="paragraph_number", data_type=DataType.INT, skip_vectorization=True),
+        Property(name="paragraph_end", data_type=DataType.INT, skip_vectorization=True),
+        Property(name="text", data_type=DataType.TEXT),
+        Property(name="image_path", data_type=DataType.TEXT, skip_vectorization=True),
+        Property(name="description", data_type=DataType.TEXT),
+        Property(name="image_sha256", data_type=DataType.TEXT, skip_vectorization=True),  # bytes live in the blob store
+        Property(name="table_content", data_type=DataType.TEXT),
+        Property(name="url", data_type=DataType.TEXT, skip_vectorization=True),
+        Property(name="audio_path", data_type=DataType.TEXT, skip_vectorization=True),
+        Property(name="transcription", data_type=DataType.TEXT),
+        Property(name="start", data_type=DataType.NUMBER, skip_vectorization=True),
+        Property(name="end", data_type=DataType.NUMBER, skip_vectorization=True),
+        Property(name="content_type", data_type=DataType.TEXT, skip_vectorization=True,
+                 tokenization=Tokenization.FIELD),
+    ]
+
+# Create the collection with the declared schema, replacing an existing one
+def initialize_collection(collection_name="RAGESGDocuments"):
+    invalidate_search_cache()
+    client = get_client()
+    if collection_name in client.collections.list_all():
+        client.collections.delete(collection_name)
 
     client.collections.create(
-        name="RAGESGDocuments",
-        properties=properties,
+        name=collection_name,
+        description=new_revision(),
+        properties=get_properties(),
         vectorizer_config=None
     )
 
-# Generate embedding
-def get_embedding(text):
-    return embedding_model.encode(text).tolist()
+# Data ingestion functions; record IDs and embedded documents are those of the Chroma and numpy backends
+def ingest_records(collection, records, content_type, batch_size=INGEST_BATCH_SIZE):
+    """Add records of one content type, embedding each batch with one encode call."""
+    id_fn, document_fn = RECORD_KINDS[content_type]
+    with collection.batch.dynamic() as batch:
+        for chunk in tqdm(iter_batches(records, batch_size), desc=f"Ingesting {content_type} data"):
+            vectors = get_embeddings([document_fn(record) for record in chunk], batch_size)
+            for record, vector in zip(chunk, vectors):
+                batch.add_object(
+                    properties={**record, "content_type": content_type},
+                    uuid=id_fn(record),
+                    vector=vector
+                )
+    mark_collection_changed(collection)
 
-# Data ingestion functions
 def ingest_audio_data(collection, audio_data):
-    with collection.batch.dynamic() as batch:
-        for audio in tqdm(audio_data, desc="Ingesting audio data"):
-            vector = get_embedding(audio['transcription'])
-            batch.add_object(
-                properties={**audio, "content_type": "audio"},
-                uuid=generate_uuid5(audio['url']),
-                vector=vector
-            )
+    ingest_records(collection, audio_data, "audio")
+
+def ingest_audio_segment_data(collection, segment_data):
+    ingest_records(collection, segment_data, "audio_segment")
 
 def ingest_text_data(collection, text_data):
-    with collection.batch.dynamic() as batch:
-        for text in tqdm(text_data, desc="Ingesting text data"):
-            vector = get_embedding(text['text'])
-            batch.add_object(
-                properties={**text, "content_type": "text"},
-                uuid=generate_uuid5(f"{text['source_document']}_{text['page_number']}_{text['paragraph_number']}"),
-                vector=vector
-            )
+    ingest_records(collection, text_data, "text")
 
 def ingest_image_data(collection, image_data):
-    with collection.batch.dynamic() as batch:
-        for image in tqdm(image_data, desc="Ingesting image data"):
-            vector = get_embedding(image['description'])
-            batch.add_object(
-                properties={**image, "content_type": "image"},
-                uuid=generate_uuid5(f"{image['source_document']}_{image['page_number']}_{image['image_path']}"),
-                vector=vector
-            )
+    ingest_records(collection, image_data, "image")
 
 def ingest_table_data(collection, table_data):
-    with collection.batch.dynamic() as batch:
-        for table in tqdm(table_data, desc="Ingesting table data"):
-            vector = get_embedding(table['description'])
-            batch.add_object(
-                properties={**table, "content_type": "table"},
-                uuid=generate_uuid5(f"{table['source_document']}_{table['page_number']}"),
-                vector=vector
-            )
+    ingest_records(collection, number_tables(table_data), "table")
 
 # Unified ingestion function
-def ingest_all_data(collection_name, audio_data, text_data, image_data, table_data):
+def ingest_all_data(collection_name, audio_data, text_data, image_data, table_data, audio_segment_data=None):
+    client = get_client()
+    if collection_name not in client.collections.list_all():
+        # Adding objects would auto-create a schema that word-tokenizes the filter fields
+        initialize_collection(collection_name)
     collection = client.collections.get(collection_name)
     ingest_audio_data(collection, audio_data)
+    if audio_segment_data:
+        ingest_audio_segment_data(collection, audio_segment_data)
     ingest_text_data(collection, text_data)
     ingest_image_data(collection, image_data)
     ingest_table_data(collection, table_data)
 
+# Query embedding, cached per query string
+def get_query_embedding(query: str):
+    query_vector = query_embedding_cache.get(query)
+    if query_vector is None:
+        query_vector = get_embedding(query)
+        query_embedding_cache.set(query, query_vector)
+    return query_vector
+
+# Helper: metadata filters as a Weaviate filter
+def build_filters(content_type=None, source_document=None, page_range=None):
+    """Same arguments as vector_storage.build_where; returns None without filters."""
+    from weaviate.classes.query import Filter
+
+    filters = []
+    for field, value in (("content_type", content_type), ("source_document", source_document)):
+        if isinstance(value, (list, tuple, set)):
+            filters.append(Filter.by_property(field).contains_any(list(value)))
+        elif value is not None:
+            filters.append(Filter.by_property(field).equal(value))
+    if page_range:
+        first, last = page_range
+        if first is not None:
+            filters.append(Filter.by_property("page_number").greater_or_equal(first))
+        if last is not None:
+            filters.append(Filter.by_property("page_number").less_or_equal(last))
+
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else Filter.all_of(filters)
+
 # Multimodal search function
-def search_multimodal(query: str, limit: int = 10):
-    query_vector = get_embedding(query)
-    collection = client.collections.get("RAGESGDocuments")
-    return collection.query.near_vector(
-        near_vector=query_vector,
-        limit=limit,
-        return_metadata=wq.MetadataQuery(distance=True),
-        return_properties=[
-            "content_type", "url", "audio_path", "transcription",
-            "source_document", "page_number", "paragraph_number", "text",
-            "image_path", "description", "table_content"
-        ]
-    ).objects
-
-# Function to delete collection before running ingestion
+def search_multimodal(query: str, limit: int = 10, filters=None, content_type=None, source_document=None,
+                      page_range=None, hybrid=False):
+    """
+    content_type, source_document and page_range are pushed down into the query as Weaviate filters.
+    With hybrid=True, Weaviate's own BM25 ranking over the text fields is fused with the vector
+    ranking by reciprocal rank fusion (HybridFusion.RANKED).
+    """
+    key = search_key(query, limit, {"filters": filters, "content_type": content_type,
+                                    "source_document": source_document, "page_range": page_range,
+                                    "hybrid": hybrid})
+    results = search_cache.get(key)
+    if results is not None:
+        return results
+
+    import weaviate.classes.query as wq
+    from weaviate.classes.query import Filter
+    pushed_down = build_filters(content_type, source_document, page_range)
+    if filters is not None and pushed_down is not None:
+        filters = Filter.all_of([filters, pushed_down])
+    else:
+        filters = filters if filters is not None else pushed_down
+    query_vector = get_query_embedding(query)
+    collection = get_client().collections.get("RAGESGDocuments")
+    return_properties = [
+        "content_type", "url", "audio_path", "transcription", "start", "end",
+        "source_document", "page_number", "paragraph_number", "paragraph_end", "text",
+        "image_path", "image_sha256", "description", "table_content"
+    ]
+    if hybrid:
+        from lexical_index import LEXICAL_FIELDS
+        results = collection.query.hybrid(
+            query=query,
+            vector=query_vector,
+            query_properties=list(LEXICAL_FIELDS),
+            fusion_type=wq.HybridFusion.RANKED,
+            limit=limit,
+            filters=filters,
+            return_metadata=wq.MetadataQuery(distance=True, score=True),
+            return_properties=return_properties
+        ).objects
+    else:
+        results = collection.query.near_vector(
+            near_vector=query_vector,
+            limit=limit,
+            filters=filters,
+            return_metadata=wq.MetadataQuery(distance=True),
+            return_properties=return_properties
+        ).objects
+    search_cache.set(key, results)
+    return results
+
+# Function to empty the collection before running ingestion
 def reset_collection():
-    """Deletes the Weaviate collection RAGESGDocuments if it exists."""
-    if "RAGESGDocuments" in client.collections.list_all():
-        client.collections.delete("RAGESGDocuments")
+    """Deletes the Weaviate collection RAGESGDocuments if it exists and recreates it with the declared schema."""
+    if "RAGESGDocuments" in get_client().collections.list_all():
         print("RAGESGDocuments collection has been deleted.")
     else:
         print("Collection RAGESGDocuments does not exist, skipping deletion.")
+    initialize_collection()
+    print("RAGESGDocuments collection has been created.")
@@ -0,0 +1,42 @@
+import hashlib
+import os
+import sys
+import numpy as np
+import pytest
+
+# The modules in src/ import each other by bare name, as when run from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import resources
+import embeddings
+import numpy_vector_store
+from vector_store import NumpyStore
+
+
+@pytest.fixture(autouse=True)
+def reset_resources():
+    """Drop stubs injected with resources.override() after each test."""
+    yield
+    resources.reset()
+
+
+def fake_embedding(text):
+    """Deterministic stand-in for the sentence-transformers model."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+
+
+@pytest.fixture
+def numpy_store(tmp_path, monkeypatch):
+    """NumpyStore in a temporary directory holding ten text paragraphs and one fund table."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(embeddings, "get_embedding", fake_embedding)
+    monkeypatch.setattr(numpy_vector_store, "get_embeddings",
+                        lambda texts, batch_size=None: np.stack([fake_embedding(text) for text in texts]))
+    store = NumpyStore()
+    text = [{"source_document": "a.pdf", "page_number": page, "paragraph_number": 1, "text": f"paragraph {page}"}
+            for page in range(1, 11)]
+    tables = [{"source_document": "a.pdf", "page_number": 3,
+               "table_content": "Parnassus Mid Cap Fund | -1,234.5", "description": "fund flows"}]
+    store.ingest_all_data([], text, [], tables)
+    return store
@@ -0,0 +1,29 @@
+import sqlite3
+import numpy as np
+from answer_cache import SemanticAnswerCache
+
+
+def test_answers_only_match_the_same_retrieval_options(tmp_path):
+    cache = SemanticAnswerCache(str(tmp_path / "answers.sqlite3"))
+    vector = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    cache.store("net flows?", vector, "hybrid answer", [{"content_type": "table"}], "v1", retrieval="hybrid")
+
+    assert cache.lookup(vector, "v1", retrieval="plain") is None
+    assert cache.lookup(vector, "v1", retrieval="hybrid")["ai_response"] == "hybrid answer"
+
+
+def test_cache_files_without_retrieval_tags_are_migrated(tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE answers (id INTEGER PRIMARY KEY, query TEXT NOT NULL, embedding BLOB NOT NULL, "
+        "ai_response TEXT NOT NULL, sources TEXT NOT NULL, fingerprint TEXT NOT NULL, last_access REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO answers VALUES (1, 'q', ?, 'old answer', '[]', 'v1', 0)",
+                 (np.array([1.0, 0.0], dtype=np.float32).tobytes(),))
+    conn.commit()
+    conn.close()
+
+    cache = SemanticAnswerCache(path)
+    assert cache.lookup(np.array([1.0, 0.0]), "v1", retrieval="tagged") is None
+    assert cache.lookup(np.array([1.0, 0.0]), "v1")["ai_response"] == "old answer"
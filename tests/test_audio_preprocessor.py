@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from audio_preprocessor import SAMPLE_RATE, VAD_FRAME_SECONDS, VAD_PAD_SECONDS, SpeechAudio, detect_speech, to_source_time
+
+FRAME = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+PAD = int(VAD_PAD_SECONDS * SAMPLE_RATE)
+
+
+def recording(layout):
+    """(is_speech, frames) runs: a loud 440 Hz tone for speech over a quiet 220 Hz music bed throughout."""
+    t = np.arange(sum(frames for _, frames in layout) * FRAME) / SAMPLE_RATE
+    samples = 0.01 * np.sin(2 * np.pi * 220 * t)
+    position = 0
+    for is_speech, frames in layout:
+        if is_speech:
+            span = slice(position * FRAME, (position + frames) * FRAME)
+            samples[span] += 0.5 * np.sin(2 * np.pi * 440 * t[span])
+        position += frames
+    return samples.astype(np.float32)
+
+
+def test_vad_drops_the_music_bed_and_bridges_short_pauses():
+    # 3 s of music between the first two utterances, a 0.6 s pause between the last two
+    samples = recording([(False, 30), (True, 60), (False, 100), (True, 30), (False, 20), (True, 30), (False, 30)])
+    assert detect_speech(samples) == [
+        (30 * FRAME - PAD, 90 * FRAME + PAD),
+        (190 * FRAME - PAD, 270 * FRAME + PAD),
+    ]
+
+
+def test_silence_has_no_speech():
+    assert detect_speech(np.zeros(SAMPLE_RATE, dtype=np.float32)) == []
+
+
+def test_windows_map_back_to_source_times():
+    samples = np.arange(6 * SAMPLE_RATE, dtype=np.float32)
+    speech = SpeechAudio(samples, [(1 * SAMPLE_RATE, 3 * SAMPLE_RATE), (5 * SAMPLE_RATE, 6 * SAMPLE_RATE)])
+    assert speech.skipped_seconds == pytest.approx(3.0)
+
+    # 1.5 s windows: the first region is split, its tail shares a window with the second region
+    windows = list(speech.windows(window_seconds=1.5))
+    assert [len(window) for window, _ in windows] == [int(1.5 * SAMPLE_RATE)] * 2
+    first, second = (timeline for _, timeline in windows)
+    assert to_source_time(first, 0.5) == pytest.approx(1.5)
+    assert to_source_time(second, 0.25) == pytest.approx(2.75)
+    assert to_source_time(second, 0.75) == pytest.approx(5.25)
+
+    # Each mapped time points at the sample that sits at that time within the window
+    window, timeline = windows[1]
+    assert window[int(0.75 * SAMPLE_RATE)] == samples[int(to_source_time(timeline, 0.75) * SAMPLE_RATE)]
+
+    (whole, timeline), = speech.windows()
+    assert len(whole) == 3 * SAMPLE_RATE
+    assert to_source_time(timeline, 2.5) == pytest.approx(5.5)
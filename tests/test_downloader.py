@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from downloader import YouTubeAudioDownloader
+
+
+class FakeExtractor:
+    """Stand-in for YoutubeDL: writes a small file per URL and tracks downloads in flight per host."""
+
+    def __init__(self, fail_urls=(), delay=0.0):
+        self.fail_urls = set(fail_urls)
+        self.delay = delay
+        self.calls = []
+        self.in_flight = {}
+        self.peak = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, options):
+        self.options = options
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True):
+        host = url.split("/")[2]
+        with self._lock:
+            self.calls.append(url)
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.in_flight[host])
+        try:
+            time.sleep(self.delay)
+            if url in self.fail_urls:
+                raise RuntimeError("video unavailable")
+            info = {"title": url.rsplit("=", 1)[-1], "ext": "m4a"}
+            with open(self.prepare_filename(info), "wb") as f:
+                f.write(url.encode("utf-8"))
+            return info
+        finally:
+            with self._lock:
+                self.in_flight[host] -= 1
+
+    def prepare_filename(self, info):
+        return self.options["outtmpl"].replace("%(title)s", info["title"]).replace("%(ext)s", info["ext"])
+
+
+def urls(host, count):
+    return [f"https://{host}/watch?v=video{i}" for i in range(count)]
+
+
+def test_manifest_downloads_are_reused_without_extractor_calls(tmp_path):
+    batch = urls("www.youtube.com", 3)
+    first = FakeExtractor()
+    downloaded = YouTubeAudioDownloader(str(tmp_path), ydl_factory=first).download_multiple_audios(batch, concurrent=True)
+    assert len(first.calls) == 3
+
+    second = FakeExtractor()
+    reused = YouTubeAudioDownloader(str(tmp_path), ydl_factory=second).download_multiple_audios(batch, concurrent=True)
+    assert second.calls == []
+    assert reused == downloaded
+    assert list(reused) == batch
+
+
+def test_concurrent_downloads_respect_the_per_host_limit(tmp_path):
+    extractor = FakeExtractor(delay=0.05)
+    downloader = YouTubeAudioDownloader(str(tmp_path), ydl_factory=extractor, max_workers=6, per_host_limit=2)
+    batch = urls("www.youtube.com", 6) + urls("vimeo.com", 3)
+    downloaded = downloader.download_multiple_audios(batch, concurrent=True)
+
+    assert len(downloaded) == 9
+    assert extractor.peak["www.youtube.com"] == 2
+    assert extractor.peak["vimeo.com"] <= 2
+
+
+def test_failed_url_does_not_abort_the_batch(tmp_path):
+    batch = urls("www.youtube.com", 4)
+    extractor = FakeExtractor(fail_urls=[batch[1]])
+    downloaded = YouTubeAudioDownloader(str(tmp_path), ydl_factory=extractor).download_multiple_audios(batch, concurrent=True)
+
+    assert list(downloaded) == [batch[0], batch[2], batch[3]]
+    assert all(os.path.exists(path) for path in downloaded.values())
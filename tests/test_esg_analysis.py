@@ -0,0 +1,19 @@
+import resources
+import esg_analysis
+from answer_cache import SemanticAnswerCache
+
+
+def test_cached_answers_are_not_shared_across_retrieval_modes(numpy_store, tmp_path, monkeypatch):
+    resources.override("vector_store", numpy_store)
+    resources.override("answer_cache", SemanticAnswerCache(str(tmp_path / "answers.sqlite3")))
+    monkeypatch.setattr(esg_analysis, "generate_llm_response", lambda query: "answer")
+    query = "net flows for Parnassus Mid Cap Fund"
+
+    plain = esg_analysis.esg_analysis(query)
+    hybrid = esg_analysis.esg_analysis(query, hybrid=True)
+    hybrid_again = esg_analysis.esg_analysis(query, hybrid=True)
+
+    assert "cached_query" not in plain
+    assert "cached_query" not in hybrid
+    assert hybrid_again["cached_query"] == query
+    assert hybrid_again["sources"] == hybrid["sources"]
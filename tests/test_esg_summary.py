@@ -0,0 +1,54 @@
+import resources
+import esg_summary
+from disk_cache import DiskLRUCache
+
+
+class StubTokenizer:
+    def __call__(self, prompts):
+        return {"input_ids": [prompt.split() for prompt in prompts]}
+
+
+class StubTextGenerator:
+    """Mimics the transformers text2text-generation pipeline: a list input gives a flat list of dicts."""
+
+    def __init__(self):
+        self.tokenizer = StubTokenizer()
+        self.calls = []
+
+    def __call__(self, inputs, **kwargs):
+        self.calls.append(list(inputs) if isinstance(inputs, list) else inputs)
+        if isinstance(inputs, list):
+            return [{"generated_text": f"summary of {prompt}"} for prompt in inputs]
+        return [{"generated_text": f"summary of {inputs}"}]
+
+
+def test_generate_llm_responses_keeps_prompt_order():
+    generator = StubTextGenerator()
+    resources.override("text_generator", generator)
+    prompts = ["short", "a much longer prompt here", "mid length prompt"]
+
+    assert esg_summary.generate_llm_responses(prompts) == [f"summary of {prompt}" for prompt in prompts]
+    # Sent longest first, so batches pad to similar lengths
+    assert generator.calls == [["a much longer prompt here", "mid length prompt", "short"]]
+
+
+def test_generate_llm_responses_accepts_nested_outputs():
+    class NestedGenerator(StubTextGenerator):
+        def __call__(self, inputs, **kwargs):
+            return [[output] for output in super().__call__(inputs, **kwargs)]
+
+    resources.override("text_generator", NestedGenerator())
+    assert esg_summary.generate_llm_responses(["one", "two words"]) == ["summary of one", "summary of two words"]
+
+
+def test_generate_cached_responses_generates_each_key_once(tmp_path):
+    generator = StubTextGenerator()
+    resources.override("text_generator", generator)
+    resources.override("summary_cache", DiskLRUCache(str(tmp_path / "summaries.sqlite3"), 1024 * 1024))
+
+    first = esg_summary.generate_cached_responses(["table a", "table b", "table a"], ["ka", "kb", "ka"])
+    second = esg_summary.generate_cached_responses(["table a", "table b"], ["ka", "kb"])
+
+    assert first == ["summary of table a", "summary of table b", "summary of table a"]
+    assert second == first[:2]
+    assert generator.calls == [["table a", "table b"]]
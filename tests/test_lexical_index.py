@@ -0,0 +1,82 @@
+import math
+import numpy as np
+import pytest
+from lexical_index import BM25_B, BM25_K1, LexicalIndex, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = {
+    "fund": "Parnassus Mid Cap Fund net flows -1,234.5 net",
+    "carbon": "carbon targets and net zero",
+    "board": "board diversity",
+}
+
+
+def bm25(query, documents):
+    """Reference BM25 computed directly from the token lists."""
+    tokens = {record_id: tokenize(text) for record_id, text in documents.items()}
+    average_length = sum(map(len, tokens.values())) / len(tokens)
+    scores = {}
+    for record_id, words in tokens.items():
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in other for other in tokens.values())
+            tf = words.count(term)
+            if tf:
+                idf = math.log1p((len(tokens) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(words) / average_length))
+        if score:
+            scores[record_id] = score
+    return scores
+
+
+def build(documents, path=None):
+    index = LexicalIndex(path)
+    index.update(list(documents), list(documents.values()))
+    index.commit()
+    return index
+
+
+def test_tokens_keep_numbers_and_codes_whole():
+    assert tokenize("Net flows -1,234.5 in Q1 (ESG-related)") == ["net", "flows", "1,234.5", "in", "q1", "esg-related"]
+
+
+def test_scores_match_bm25_and_postings_are_term_major():
+    index = build(DOCUMENTS)
+    results = index.search("net flows", limit=10)
+    expected = bm25("net flows", DOCUMENTS)
+    assert [record_id for record_id, _ in results] == ["fund", "carbon"]
+    assert dict(results) == pytest.approx(expected, rel=1e-5)
+
+    # CSR layout: the postings of each term are one contiguous, document-sorted slice
+    term = index.term_ids["net"]
+    docs = index.postings_docs[index.term_offsets[term]:index.term_offsets[term + 1]]
+    assert sorted(index.ids[doc] for doc in docs) == ["carbon", "fund"]
+    assert list(docs) == sorted(docs)
+
+
+def test_allowed_mask_and_limit():
+    index = build(DOCUMENTS)
+    allowed = np.array([record_id != "fund" for record_id in index.ids])
+    assert [record_id for record_id, _ in index.search("net", 10, allowed)] == ["carbon"]
+    assert len(index.search("net", 1)) == 1
+
+
+def test_npz_round_trip_and_incremental_commit(tmp_path):
+    path = str(tmp_path / "lexical.npz")
+    build(DOCUMENTS, path).save()
+    reloaded = LexicalIndex(path)
+    assert reloaded.search("net flows") == pytest.approx(build(DOCUMENTS).search("net flows"))
+
+    # Unchanged texts are not queued; a changed one and a removal are applied by one commit
+    assert reloaded.update(list(DOCUMENTS), list(DOCUMENTS.values())) == 0
+    assert reloaded.update(["board"], ["board net pay"]) == 1
+    reloaded.remove(["carbon"])
+    assert reloaded.commit()
+    updated = {"fund": DOCUMENTS["fund"], "board": "board net pay"}
+    assert dict(reloaded.search("net")) == pytest.approx(bm25("net", updated), rel=1e-5)
+    assert "targets" not in reloaded.term_ids
+
+
+def test_reciprocal_rank_fusion_sums_inverse_ranks():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [record_id for record_id, _ in fused] == ["a", "c", "b"]
+    assert dict(fused) == pytest.approx({"a": 1 / 61 + 1 / 62, "c": 1 / 63 + 1 / 61, "b": 1 / 62})
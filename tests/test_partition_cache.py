@@ -0,0 +1,34 @@
+import os
+from unstructured.documents.elements import ElementMetadata, Image
+from partition_cache import PartitionCache
+
+
+def image_element(path):
+    return Image(text="chart", metadata=ElementMetadata(image_path=path, page_number=1))
+
+
+def test_load_restores_the_cached_bytes_over_another_pdfs_figure(tmp_path):
+    extracted = tmp_path / "extracted"
+    extracted.mkdir()
+    (extracted / "figure-1-1.jpg").write_bytes(b"AAAA")
+    cache = PartitionCache(cache_dir=str(tmp_path / "cache"))
+    cache.store("report-a", [image_element(str(extracted / "figure-1-1.jpg"))])
+
+    # Another PDF extracted a figure of the same name into the shared image directory
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    (image_dir / "figure-1-1.jpg").write_bytes(b"BBBB")
+
+    elements = cache.load("report-a", str(image_dir))
+    assert elements[0].metadata.image_path == str(image_dir / "figure-1-1.jpg")
+    assert (image_dir / "figure-1-1.jpg").read_bytes() == b"AAAA"
+
+
+def test_load_keeps_the_path_of_an_image_missing_at_store_time(tmp_path):
+    missing = str(tmp_path / "gone" / "figure-2-1.jpg")
+    cache = PartitionCache(cache_dir=str(tmp_path / "cache"))
+    cache.store("report-b", [image_element(missing)])
+
+    elements = cache.load("report-b", str(tmp_path / "images"))
+    assert elements[0].metadata.image_path == missing
+    assert not os.path.exists(tmp_path / "images" / "figure-2-1.jpg")
@@ -0,0 +1,69 @@
+import time
+import resources
+import reranker
+from reranker import Reranker
+
+
+class StubCrossEncoder:
+    """Scores by whether the candidate mentions the fund; costs seconds_per_pair per pair."""
+
+    def __init__(self, seconds_per_pair=0.001):
+        self.seconds_per_pair = seconds_per_pair
+        self.batches = []
+
+    def predict(self, pairs, batch_size):
+        self.batches.append(len(pairs))
+        time.sleep(self.seconds_per_pair * len(pairs))
+        return [float("Parnassus" in text) for _, text in pairs]
+
+
+def make_hits(count, relevant):
+    return [
+        {"id": f"doc-{i}", "distance": i / count,
+         "metadata": {"text": "Parnassus Mid Cap Fund" if i in relevant else f"paragraph {i}", "content_hash": str(i)}}
+        for i in range(count)
+    ]
+
+
+def test_rerank_moves_relevant_hit_up_and_caches_scores():
+    model = StubCrossEncoder()
+    resources.override("rerank_model", model)
+    stage = Reranker(budget_seconds=1.0)
+    hits = make_hits(10, relevant={7})
+
+    first = stage.rerank("Parnassus net flows", hits, limit=3)
+    second = stage.rerank("Parnassus net flows", hits, limit=3)
+
+    assert first["hits"][0]["id"] == "doc-7"
+    assert {"id": "doc-7", "from": 7, "to": 0} in first["position_changes"]
+    assert model.batches == [10]  # One batched pass; the second call is served from the cache
+    assert second["cached"] == 10 and second["scored"] == 0
+
+
+def test_model_load_does_not_count_against_the_budget():
+    model = StubCrossEncoder(seconds_per_pair=0.001)
+
+    def slow_load():
+        time.sleep(0.5)
+        return model
+
+    resources.register("rerank_model", slow_load)
+    try:
+        stage = Reranker(budget_seconds=0.25)
+        for query in ("first", "second", "third"):
+            stage.rerank(query, make_hits(30, relevant=set()), limit=5)
+    finally:
+        resources.register("rerank_model", reranker._load_rerank_model)
+
+    assert model.batches == [30, 30, 30]
+    assert stage.seconds_per_pair < 0.01
+
+
+def test_candidates_beyond_the_budget_keep_their_order():
+    resources.override("rerank_model", StubCrossEncoder())
+    stage = Reranker(budget_seconds=0.05)
+    stage.seconds_per_pair = 0.01  # Five pairs fit the budget
+    result = stage.rerank("Parnassus", make_hits(10, relevant={8}), limit=None)
+
+    assert result["scored"] == 5
+    assert [hit["id"] for hit in result["hits"][5:]] == [f"doc-{i}" for i in range(5, 10)]
@@ -0,0 +1,38 @@
+import resources
+from text_chunker import chunk_text_records, format_paragraphs
+
+
+def whitespace_tokenizer(texts, add_special_tokens=False):
+    """Stand-in for the embedding model's tokenizer: one token per word."""
+    return {"input_ids": [text.split() for text in texts]}
+
+
+def paragraphs(words_per_paragraph, page=1, source_document="a.pdf"):
+    return [{"source_document": source_document, "page_number": page, "paragraph_number": n,
+             "text": " ".join([f"w{n}"] * words)}
+            for n, words in enumerate(words_per_paragraph, start=1)]
+
+
+def ranges(chunks):
+    return [(chunk["page_number"], chunk["paragraph_number"], chunk["paragraph_end"]) for chunk in chunks]
+
+
+def test_paragraphs_are_packed_up_to_the_token_limit_within_a_page():
+    resources.override("chunk_tokenizer", whitespace_tokenizer)
+    records = paragraphs([4, 4, 4, 20, 2], page=1) + paragraphs([3], page=2)
+    chunks = chunk_text_records(records, max_tokens=10)
+
+    # A paragraph over the limit is a chunk of its own, and chunks never span pages
+    assert ranges(chunks) == [(1, 1, 2), (1, 3, 3), (1, 4, 4), (1, 5, 5), (2, 1, 1)]
+    assert chunks[0]["text"] == "w1 w1 w1 w1\n\nw2 w2 w2 w2"
+    assert format_paragraphs(chunks[0]) == "Paragraphs 1-2"
+    assert format_paragraphs(chunks[1]) == "Paragraph 3"
+
+
+def test_overlap_carries_trailing_paragraphs_that_fit():
+    resources.override("chunk_tokenizer", whitespace_tokenizer)
+    chunks = chunk_text_records(paragraphs([3, 3, 3, 3, 3]), max_tokens=10, overlap_tokens=4)
+
+    # Only the last paragraph (3 tokens) fits the 4-token overlap
+    assert ranges(chunks) == [(1, 1, 3), (1, 3, 5)]
+    assert all(len(chunk["text"].split()) <= 10 for chunk in chunks)
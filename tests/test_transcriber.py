@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+import pytest
+import transcriber
+from transcriber import AudioTranscriber
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="the stand-in workers are inherited by forked pool processes")
+
+
+def fake_init_worker(model_name, device, torch_threads, preprocessor):
+    pass
+
+
+def fake_transcribe_in_worker(audio_file, decode_options):
+    """Stand-in for Whisper: "crash" files take the worker process down, "corrupt" ones fail."""
+    name = os.path.basename(audio_file)
+    if name.startswith("crash"):
+        os._exit(1)
+    if name.startswith("corrupt"):
+        return None, "invalid data"
+    return {"text": name, "segments": [], "skipped_seconds": 0.0}, None
+
+
+@pytest.fixture
+def audio_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcriber, "_init_worker", fake_init_worker)
+    monkeypatch.setattr(transcriber, "_transcribe_in_worker", fake_transcribe_in_worker)
+    files = {}
+    for name in ("a", "b", "crash", "c", "corrupt", "d"):
+        path = tmp_path / f"{name}.mp3"
+        path.write_bytes(b"audio")
+        files[f"https://youtu.be/{name}"] = str(path)
+    return files
+
+
+def test_a_dying_worker_only_loses_its_own_file(tmp_path, audio_files, capsys):
+    audio_transcriber = AudioTranscriber(str(tmp_path), device="cpu", use_cache=False, use_vad=False)
+    audio_data = audio_transcriber.transcribe_all_audios_parallel(audio_files, workers=2)
+
+    assert [record["transcription"] for record in audio_data] == ["a.mp3", "b.mp3", "c.mp3", "d.mp3"]
+    output = capsys.readouterr().out
+    assert "retrying" in output
+    assert f"Error transcribing {audio_files['https://youtu.be/crash']}: worker process died" in output
+    assert f"Error transcribing {audio_files['https://youtu.be/corrupt']}: invalid data" in output
+
+
+def test_run_pool_reports_the_files_a_broken_pool_left_unfinished(tmp_path, audio_files):
+    audio_transcriber = AudioTranscriber(str(tmp_path), device="cpu", use_cache=False, use_vad=False)
+    paths = list(audio_files.values())
+    finished, unfinished = audio_transcriber.run_pool(list(enumerate(paths)), 1, 1)
+
+    # One worker runs the files in order: everything from the crash on is unfinished
+    assert sorted(finished) == [0, 1]
+    assert unfinished == [2, 3, 4, 5]
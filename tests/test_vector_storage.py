@@ -0,0 +1,82 @@
+import pytest
+import resources
+import vector_storage
+from conftest import fake_embedding
+from lexical_index import LexicalIndex
+
+
+class StubChromaCollection:
+    """Keeps records by ID and logs the IDs of every upsert and delete."""
+
+    def __init__(self):
+        self.records = {}
+        self.metadata = {}
+        self.upserted = []
+        self.deleted = []
+
+    def get(self, ids=None, where=None, include=()):
+        if ids is not None:
+            found = [record_id for record_id in ids if record_id in self.records]
+        else:
+            clauses = where["$and"]
+            found = [record_id for record_id, metadata in self.records.items()
+                     if all(metadata.get(field) == value for clause in clauses for field, value in clause.items())]
+        return {"ids": found, "metadatas": [self.records[record_id] for record_id in found]}
+
+    def upsert(self, documents, metadatas, ids, embeddings):
+        self.upserted.extend(ids)
+        self.records.update(zip(ids, metadatas))
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+        for record_id in ids:
+            del self.records[record_id]
+
+    def modify(self, metadata):
+        self.metadata = metadata
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    stub = StubChromaCollection()
+    stub.encoded = []
+
+    def get_embeddings(texts, batch_size=None):
+        stub.encoded.extend(texts)
+        return [fake_embedding(text).tolist() for text in texts]
+
+    monkeypatch.setattr(vector_storage, "get_embeddings", get_embeddings)
+    resources.override("chroma_collection", stub)
+    resources.override("lexical_index", LexicalIndex(str(tmp_path / "lexical.npz")))
+    return stub
+
+
+def paragraphs(source_document, texts):
+    return [{"source_document": source_document, "page_number": 1, "paragraph_number": n, "text": text}
+            for n, text in enumerate(texts, start=1)]
+
+
+def ingest(collection, text_data):
+    collection.upserted, collection.deleted, collection.encoded = [], [], []
+    return vector_storage.bulk_ingest_text_data(text_data)
+
+
+def test_only_new_changed_and_vanished_records_are_written(collection):
+    report_a = paragraphs("a.pdf", ["net flows", "fund fees", "carbon targets"])
+    report_b = paragraphs("b.pdf", ["board diversity"])
+    ids_a = [vector_storage.text_id(record) for record in report_a]
+
+    ingest(collection, report_a + report_b)
+    assert set(collection.upserted) == set(collection.records) and len(collection.records) == 4
+
+    # An unchanged corpus does no embedding work and writes nothing
+    ingest(collection, report_a + report_b)
+    assert (collection.encoded, collection.upserted, collection.deleted) == ([], [], [])
+
+    # a.pdf alone: its edited paragraph is re-embedded, its dropped one deleted, b.pdf left alone
+    ingest(collection, paragraphs("a.pdf", ["net outflows", "fund fees"]))
+    assert collection.encoded == ["net outflows"]
+    assert collection.upserted == [ids_a[0]]
+    assert collection.deleted == [ids_a[2]]
+    assert vector_storage.text_id(report_b[0]) in collection.records
+    assert vector_storage.get_lexical_index().search("carbon") == []
@@ -0,0 +1,45 @@
+import pytest
+from vector_store import VectorStore
+
+
+def test_incomplete_backend_fails_on_creation():
+    class NoSearch(VectorStore):
+        def ingest_all_data(self, audio_data, text_data, image_data, table_data, audio_segment_data=None, **options):
+            pass
+
+    with pytest.raises(TypeError):
+        NoSearch()
+
+
+def test_filters_are_applied_in_the_index(numpy_store):
+    hits = numpy_store.search("paragraph", 10, content_type="text", page_range=(2, 4))
+    assert sorted(hit["metadata"]["page_number"] for hit in hits) == [2, 3, 4]
+
+
+def test_hybrid_search_finds_exact_fund_name(numpy_store):
+    hits = numpy_store.search("net flows for Parnassus Mid Cap Fund", 3, hybrid=True)
+    assert "table" in [hit["metadata"]["content_type"] for hit in hits]
+
+
+def test_ingesting_a_second_document_keeps_the_first(numpy_store):
+    text = [{"source_document": "b.pdf", "page_number": 1, "paragraph_number": 1, "text": "second report"}]
+    numpy_store.ingest_all_data([], text, [], [])
+    documents = [hit["metadata"]["source_document"] for hit in numpy_store.search("report", 20)]
+    assert sorted(documents) == ["a.pdf"] * 11 + ["b.pdf"]
+
+    # Re-ingesting a.pdf with fewer paragraphs only drops its own vanished rows
+    text = [{"source_document": "a.pdf", "page_number": page, "paragraph_number": 1, "text": f"paragraph {page}"}
+            for page in (1, 2)]
+    numpy_store.ingest_all_data([], text, [], [])
+    hits = numpy_store.search("report", 20)
+    assert sorted((hit["metadata"]["source_document"], hit["metadata"]["content_type"]) for hit in hits) == [
+        ("a.pdf", "table"), ("a.pdf", "text"), ("a.pdf", "text"), ("b.pdf", "text"),
+    ]
+
+
+def test_empty_ingest_changes_nothing(numpy_store):
+    audio = [{"url": "https://youtu.be/a", "audio_path": "a.m4a", "transcription": "fund flows"}]
+    numpy_store.ingest_all_data(audio, [], [], [])
+    numpy_store.ingest_all_data([], [], [], [])
+    content_types = [hit["metadata"]["content_type"] for hit in numpy_store.search("flows", 20)]
+    assert sorted(content_types) == ["audio"] + ["table"] + ["text"] * 10
@@ -0,0 +1,123 @@
+import contextlib
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("weaviate")
+from weaviate.classes.config import Tokenization
+import resources
+import vector_storage
+import weaviate_vector_storage
+from conftest import fake_embedding
+
+
+class StubBatch:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def add_object(self, properties, uuid, vector):
+        self.objects[uuid] = properties
+
+
+class StubCollection:
+    """Keeps added objects by UUID and the description that carries the revision."""
+
+    def __init__(self, description=None):
+        self.objects = {}
+        self.description = description
+        self.config = SimpleNamespace(update=self.update_config,
+                                      get=lambda: SimpleNamespace(description=self.description))
+        self.batch = SimpleNamespace(dynamic=lambda: contextlib.nullcontext(StubBatch(self.objects)))
+
+    def update_config(self, description):
+        self.description = description
+
+
+class StubCollections:
+    def __init__(self):
+        self.created = {}
+        self.collections = {}
+
+    def list_all(self):
+        return dict.fromkeys(self.collections)
+
+    def create(self, name, description, properties, vectorizer_config):
+        self.created[name] = {prop.name: prop for prop in properties}
+        self.collections[name] = StubCollection(description)
+
+    def delete(self, name):
+        del self.collections[name]
+
+    def get(self, name):
+        # Like Weaviate, objects added to an unknown collection auto-create it, without the declared schema
+        return self.collections.setdefault(name, StubCollection())
+
+
+@pytest.fixture
+def encode_calls(monkeypatch):
+    calls = []
+
+    def get_embeddings(texts, batch_size=None):
+        calls.append(list(texts))
+        return [fake_embedding(text).tolist() for text in texts]
+
+    monkeypatch.setattr(weaviate_vector_storage, "get_embeddings", get_embeddings)
+    return calls
+
+
+@pytest.fixture
+def client(encode_calls):
+    stub = SimpleNamespace(collections=StubCollections())
+    resources.override("weaviate_client", stub)
+    return stub
+
+
+def assert_field_tokenized(schema):
+    assert schema["content_type"].tokenization == Tokenization.FIELD
+    assert schema["source_document"].tokenization == Tokenization.FIELD
+
+
+def test_reset_recreates_the_collection_with_the_declared_schema(client):
+    weaviate_vector_storage.ingest_all_data("RAGESGDocuments", [], [], [], [])
+    client.collections.created.clear()
+
+    weaviate_vector_storage.reset_collection()
+    assert_field_tokenized(client.collections.created["RAGESGDocuments"])
+    assert client.collections.collections["RAGESGDocuments"].objects == {}
+
+
+def test_ingest_creates_a_missing_collection_before_adding_objects(client):
+    segments = [{"url": "https://youtu.be/a", "start": 0.0, "end": 4.0, "transcription": "fund flows"}]
+    weaviate_vector_storage.ingest_all_data("RAGESGDocuments", [], [], [], [], segments)
+
+    assert_field_tokenized(client.collections.created["RAGESGDocuments"])
+    stored = client.collections.collections["RAGESGDocuments"].objects
+    assert [properties["content_type"] for properties in stored.values()] == ["audio_segment"]
+
+
+def test_ingest_uses_the_record_ids_of_the_other_backends(client, encode_calls):
+    tables = [{"source_document": "a.pdf", "page_number": 9, "table_content": f"table {n}", "description": "flows"}
+              for n in (1, 2)]
+    text = [{"source_document": "a.pdf", "page_number": 1, "paragraph_number": n, "text": f"paragraph {n}"}
+            for n in (1, 2, 3)]
+    weaviate_vector_storage.ingest_all_data("RAGESGDocuments", [], text, [], tables)
+
+    stored = client.collections.collections["RAGESGDocuments"].objects
+    expected_tables = [vector_storage.table_id(table) for table in vector_storage.number_tables(tables)]
+    assert len(set(expected_tables)) == 2
+    assert set(stored) == set(expected_tables) | {vector_storage.text_id(record) for record in text}
+    # One encode call per batch, on the documents the Chroma path embeds
+    assert encode_calls == [["paragraph 1", "paragraph 2", "paragraph 3"], ["table 1", "table 2"]]
+
+
+def test_build_filters_matches_whole_values():
+    single = weaviate_vector_storage.build_filters(content_type="audio")
+    assert (single.target, single.operator.value, single.value) == ("content_type", "Equal", "audio")
+
+    combined = weaviate_vector_storage.build_filters(content_type=["text", "table"], source_document="a.pdf",
+                                                     page_range=(2, None))
+    assert [(f.target, f.operator.value, f.value) for f in combined.filters] == [
+        ("content_type", "ContainsAny", ["text", "table"]),
+        ("source_document", "Equal", "a.pdf"),
+        ("page_number", "GreaterThanEqual", 2),
+    ]
+    assert weaviate_vector_storage.build_filters() is None